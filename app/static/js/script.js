@@ -28,6 +28,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let state = {
         isStreamActive: false,
         predictionInterval: null,
+        predictionSource: null,
         isCaptureMode: false,
         capturedImageUrl: null,
         capturedClassName: null,
@@ -164,6 +165,19 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    /**
+     * Show a live camera prediction
+     * @param {Object} data - Prediction with class_name and confidence
+     */
+    function showPrediction(data) {
+        if (!state.isStreamActive || state.isCaptureMode || state.isProcessingImage) return;
+        
+        elements.className.textContent = data.class_name;
+        elements.confidenceValue.style.width = data.confidence + '%';
+        elements.confidencePercent.textContent = data.confidence + '%';
+        updateResultDisplay(data.class_name);
+    }
+
     /**
      * Update prediction from server
      */
@@ -172,19 +186,24 @@ document.addEventListener('DOMContentLoaded', function() {
         
         fetch('/get_prediction')
             .then(response => response.json())
-            .then(data => {
-                elements.className.textContent = data.class_name;
-                elements.confidenceValue.style.width = data.confidence + '%';
-                elements.confidencePercent.textContent = data.confidence + '%';
-                updateResultDisplay(data.class_name);
-            })
+            .then(showPrediction)
             .catch(error => console.error('Error fetching prediction:', error));
     }
 
     /**
-     * Start periodic prediction updates
+     * Start prediction updates: pushed by the server when supported, polled otherwise
      */
     function startPredictionUpdates() {
+        stopPredictionUpdates();
+        
+        if (window.EventSource) {
+            state.predictionSource = new EventSource('/prediction_stream');
+            state.predictionSource.onmessage = function(event) {
+                showPrediction(JSON.parse(event.data));
+            };
+            return;
+        }
+        
         updatePrediction();
         state.predictionInterval = setInterval(updatePrediction, 1000);
     }
@@ -194,6 +213,12 @@ document.addEventListener('DOMContentLoaded', function() {
      */
     function stopPredictionUpdates() {
         clearInterval(state.predictionInterval);
+        state.predictionInterval = null;
+        
+        if (state.predictionSource) {
+            state.predictionSource.close();
+            state.predictionSource = null;
+        }
     }
 
     /**
@@ -0,0 +1,300 @@
+"""Asyncio (aiohttp) front end for the classification API.
+
+    pip install aiohttp
+    python app_async.py                  # PORT (default 5000)
+
+Serves the same JSON as app.py for /upload, /capture_image, /get_prediction,
+/prediction_stream, /ready, /metrics and /admin/model, and shares its model, inference
+scheduler, result cache, image store and camera streams. Request bodies are read
+without blocking, so slow uploaders and idle SSE subscribers cost a coroutine,
+not a thread. CPU work runs elsewhere: decode/preprocess/hashing in a thread
+pool (ASYNC_DECODE_WORKERS), inference in the batching scheduler whose futures
+are awaited directly.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import app as core
+from classifier import TTA_CROP, decode_image, preprocess_image, preprocess_tta
+
+logger = logging.getLogger(__name__)
+
+# Threads for decoding, preprocessing and hashing; inference is batched by the shared scheduler
+ASYNC_DECODE_WORKERS = int(os.environ.get('ASYNC_DECODE_WORKERS', min(8, os.cpu_count() or 1)))
+# Seconds between SSE keep-alive comments
+SSE_KEEPALIVE_S = float(os.environ.get('SSE_KEEPALIVE_S', 15))
+
+decode_executor = ThreadPoolExecutor(max_workers=ASYNC_DECODE_WORKERS, thread_name_prefix='async-decode')
+
+
+class PredictionBroadcast:
+    """Fan a stream's predictions out to any number of coroutines
+
+    One thread per camera stream waits on its LatestValueChannel and hands each new
+    prediction to the event loop, where it resolves a future every subscriber awaits.
+    Thousands of idle SSE connections therefore share a single thread.
+    """
+
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.sequence, self.value = channel.latest()
+        self.subscribers = 0
+        # Serializes camera start/stop as subscribers come and go
+        self.camera_lock = asyncio.Lock()
+        self._changed = loop.create_future()
+        threading.Thread(target=self._watch, name='prediction-broadcast', daemon=True).start()
+
+    def _watch(self):
+        sequence = self.sequence
+        while True:
+            update = self.channel.wait(sequence, timeout=1.0)
+            if update is not None:
+                sequence = update[0]
+                self.loop.call_soon_threadsafe(self._publish, update)
+
+    def _publish(self, update):
+        self.sequence, self.value = update
+        changed, self._changed = self._changed, self.loop.create_future()
+        changed.set_result(None)
+
+    async def wait(self, after_sequence, timeout):
+        """Return (sequence, value) newer than after_sequence, or None on timeout"""
+        if self.sequence <= after_sequence:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._changed), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.sequence, self.value
+
+
+def get_stream(request):
+    """Camera stream named in the URL (default: the first one); 404 if unknown, 409 if disabled"""
+    if not core.CAMERA_ENABLED:
+        raise web.HTTPConflict(text=json.dumps({'error': core.CAMERA_DISABLED_ERROR}), content_type='application/json')
+    stream_id = request.match_info.get('stream_id', core.DEFAULT_STREAM_ID)
+    stream = core.camera_streams.get(stream_id)
+    if stream is None:
+        raise web.HTTPNotFound(text=json.dumps({'error': 'Page not found'}), content_type='application/json')
+    return stream
+
+
+def prepare_image(image, tta=False, bgr=False):
+    """Worker task: cache lookup and preprocessing (blocks until the model has loaded); bgr for camera frames"""
+    cached, cache_key = core.lookup_cached_result(image, tta)
+    processed_image = None
+    if cached is None and core.get_model() is not None:
+        # A fresh array: the scheduler reads it after this thread has moved on
+        processed_image = (preprocess_tta(image, core.tta_variant_count(), bgr=bgr) if tta
+                           else preprocess_image(image, bgr=bgr))
+    return cached, cache_key, processed_image
+
+
+def prepare_upload(data, tta=False):
+    """Worker task: decode an upload near model resolution, then prepare it"""
+    draft_size = int(core.UPLOAD_DECODE_SIZE / TTA_CROP) if tta else core.UPLOAD_DECODE_SIZE
+    image = decode_image(io.BytesIO(data), draft_size=draft_size)
+    return prepare_image(image, tta)
+
+
+async def run_in_decode_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(decode_executor, fn, *args)
+
+
+async def add_subscriber(stream, broadcast):
+    """Count an SSE client; there is no /video_feed here to start the camera, so the first one does"""
+    async with broadcast.camera_lock:
+        broadcast.subscribers += 1
+        if not stream.active:
+            await run_in_decode_pool(stream.start)
+
+
+async def remove_subscriber(stream, broadcast):
+    """The last SSE client to leave stops the camera, like the web UI's /stop_camera call does for app.py"""
+    async with broadcast.camera_lock:
+        broadcast.subscribers -= 1
+        if broadcast.subscribers == 0 and stream.active:
+            await run_in_decode_pool(stream.stop)
+
+
+async def classify(processed_image, tta=False):
+    """Same result as app.classify_image, awaiting the scheduler instead of blocking a thread"""
+    try:
+        # get_model() blocks while the model is loading
+        if await run_in_decode_pool(core.get_model) is None:
+            return core.simulate_result()
+        if processed_image is None:
+            return {'class_name': 'Error', 'confidence': 0.0}
+        future = core.inference_scheduler.submit(processed_image)
+        predictions = await asyncio.wrap_future(future)
+        if tta:
+            return core.format_tta_result(predictions, future.engine)
+        return core.format_result(predictions[0], future.engine)
+    except Exception as e:
+        logger.error(f"Error classifying image: {e}")
+        return {'class_name': 'Error', 'confidence': 0.0}
+
+
+async def upload_file(request):
+    """API for uploading and classifying images"""
+    post = await request.post()
+    file = post.get('file')
+    if file is None or not hasattr(file, 'file'):
+        return web.json_response({'error': 'No file found'}, status=400)
+    if file.filename == '':
+        return web.json_response({'error': 'No file selected'}, status=400)
+    if not core.allowed_file(file.filename):
+        return web.json_response({'error': 'File format not supported'}, status=400)
+
+    try:
+        # Large parts are spooled to a temporary file by request.post()
+        data = await run_in_decode_pool(file.file.read)
+        tta = request.query.get('tta', post.get('tta', '1' if core.TTA_DEFAULT else '0')) == '1'
+        cached, cache_key, processed_image = await run_in_decode_pool(prepare_upload, data, tta)
+        if cached is not None and await run_in_decode_pool(core.saved_image_exists, cached):
+            return web.json_response(cached)
+
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        saved_filename = await run_in_decode_pool(core.image_store.save_file, data, extension)
+
+        result = cached if cached is not None else await classify(processed_image, tta)
+        await run_in_decode_pool(core.store_saved_image, result, saved_filename,
+                                 core.wait_saved_requested(request.query))
+        await run_in_decode_pool(core.store_cached_result, cache_key, result)
+        return web.json_response(result)
+    except Exception as e:
+        logger.error(f"Error processing upload file: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+async def capture_image(request):
+    """API for capturing and classifying image from camera stream"""
+    frame = get_stream(request).current_frame
+    if frame is None:
+        return web.json_response({'error': 'No camera frame available'}, status=400)
+
+    try:
+        cached, cache_key, processed_image = await run_in_decode_pool(prepare_image, frame, False, True)
+        if cached is not None and await run_in_decode_pool(core.saved_image_exists, cached):
+            return web.json_response(cached)
+
+        saved_filename = await run_in_decode_pool(core.image_store.save_frame, frame)
+
+        result = cached if cached is not None else await classify(processed_image)
+        await run_in_decode_pool(core.store_saved_image, result, saved_filename,
+                                 core.wait_saved_requested(request.query))
+        await run_in_decode_pool(core.store_cached_result, cache_key, result)
+        return web.json_response(result)
+    except Exception as e:
+        logger.error(f"Error capturing image: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+async def get_prediction(request):
+    """API for getting latest classification result"""
+    return web.json_response(get_stream(request).latest_prediction)
+
+
+async def prediction_stream(request):
+    """Server-Sent Events stream that pushes every new camera prediction as soon as it is ready"""
+    stream = get_stream(request)
+    broadcast = request.app['broadcasts'][stream.stream_id]
+    await add_subscriber(stream, broadcast)
+    try:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+        await response.prepare(request)
+        sequence, prediction = broadcast.sequence, broadcast.value
+        await response.write(f"data: {json.dumps(prediction)}\n\n".encode())
+        while True:
+            update = await broadcast.wait(sequence, SSE_KEEPALIVE_S)
+            if update is None:
+                # Comment line keeps proxies from closing an idle connection
+                await response.write(b": keep-alive\n\n")
+                continue
+            sequence, prediction = update
+            await response.write(f"data: {json.dumps(prediction)}\n\n".encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        await remove_subscriber(stream, broadcast)
+    return response
+
+
+async def ready(request):
+    """Readiness probe: 200 once the model has finished loading, 503 before that"""
+    core.start_model_loading()
+    status = 200 if core.model_loaded.is_set() else 503
+    return web.json_response(core.model_status, status=status)
+
+
+async def metrics(request):
+    """API for inference queue depth, batch size and wait time metrics"""
+    stats = await run_in_decode_pool(core.collect_metrics)
+    stats['async'] = {
+        'decode_workers': ASYNC_DECODE_WORKERS,
+        'sse_subscribers': {stream_id: broadcast.subscribers
+                            for stream_id, broadcast in request.app['broadcasts'].items()}
+    }
+    return web.json_response(stats)
+
+
+async def admin_model(request):
+    """GET: served and available model versions; POST {"version": ...}: switch versions without downtime"""
+    if not core.admin_enabled():
+        return web.json_response({'error': 'Page not found'}, status=404)
+    if not core.admin_allowed(request.headers.get('X-Admin-Token')):
+        return web.json_response({'error': 'Forbidden'}, status=403)
+    if request.method == 'GET':
+        return web.json_response(await run_in_decode_pool(core.model_versions))
+    try:
+        body = await request.json() if request.can_read_body and request.content_type == 'application/json' else {}
+    except ValueError:
+        return web.json_response({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(body, dict):
+        return web.json_response({'error': 'JSON body must be an object'}, status=400)
+    version = body.get('version') or request.query.get('version')
+    try:
+        await run_in_decode_pool(core.select_model_version, version)
+    except KeyError as e:
+        return web.json_response({'error': str(e)}, status=404)
+    except RuntimeError as e:
+        return web.json_response({'error': str(e)}, status=409)
+    return web.json_response(await run_in_decode_pool(core.model_versions), status=202)
+
+
+async def start_broadcasts(application):
+    loop = asyncio.get_running_loop()
+    application['broadcasts'] = {stream_id: PredictionBroadcast(stream.predictions, loop)
+                                 for stream_id, stream in core.camera_streams.items()}
+
+
+def create_app():
+    """Build the aiohttp application"""
+    application = web.Application(client_max_size=core.app.config['MAX_CONTENT_LENGTH'])
+    application.on_startup.append(start_broadcasts)
+    application.router.add_post('/upload', upload_file)
+    application.router.add_post('/capture_image', capture_image)
+    application.router.add_post('/capture_image/{stream_id}', capture_image)
+    application.router.add_get('/get_prediction', get_prediction)
+    application.router.add_get('/get_prediction/{stream_id}', get_prediction)
+    application.router.add_get('/prediction_stream', prediction_stream)
+    application.router.add_get('/prediction_stream/{stream_id}', prediction_stream)
+    application.router.add_get('/ready', ready)
+    application.router.add_get('/metrics', metrics)
+    application.router.add_get('/admin/model', admin_model)
+    application.router.add_post('/admin/model', admin_model)
+    application.router.add_static('/static', core.app.static_folder)
+    return application
+
+
+if __name__ == '__main__':
+    logger.info("Starting asyncio trash classification API")
+    web.run_app(create_app(), host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -5,8 +5,8 @@ import os
 import time
 import uuid
 import logging
-from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import img_to_array
+from inference_engine import load_engine
 from PIL import Image
 import io
 
@@ -24,7 +24,6 @@ st.set_page_config(
 )
 
 # Configuration paths
-MODEL_PATH = 'model/trash_classification_model.h5'
 CLASS_NAMES_PATH = 'model/class_names.txt'
 UPLOAD_FOLDER = 'uploads'
 
@@ -43,17 +42,8 @@ def load_class_names():
 # Load class names
 @st.cache_resource
 def load_model_data():
-    try:
-        if os.path.exists(MODEL_PATH):
-            model = load_model(MODEL_PATH)
-            logger.info("Model loaded successfully")
-            return model
-        else:
-            logger.warning(f"Model file {MODEL_PATH} not found")
-            return None
-    except Exception as e:
-        logger.error(f"Error loading model: {e}")
-        return None
+    # Engine (keras / tflite-fp16 / tflite-int8 / onnx) is selected by INFERENCE_ENGINE
+    return load_engine()
 
 # Load model and class names
 TRASH_CATEGORIES = load_class_names()
@@ -116,7 +106,7 @@ def classify_image(image):
             if processed_image is None:
                 return {'class_name': 'Error', 'confidence': 0.0}
                 
-            predictions = model.predict(processed_image, verbose=0)[0]
+            predictions = model.predict(processed_image)[0]
             class_index = np.argmax(predictions)
             confidence = float(predictions[class_index])
             class_name = TRASH_CATEGORIES[class_index]
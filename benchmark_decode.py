@@ -0,0 +1,81 @@
+"""Decode/preprocess throughput: request threads vs the shared-memory process pool.
+
+    python benchmark_decode.py --folder rubbish-data/test --processes 1 2 4 8 --output decode.json
+
+Every case decodes and preprocesses the same files (as bytes, like uploads) into
+model input and reports images/sec and speedup over the single-thread baseline:
+  - threads:   ThreadPoolExecutor calling decode_image + preprocess_image (GIL-bound parts serialize)
+  - processes: DecodePool workers writing straight into shared-memory batch buffers
+"""
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from classifier import IMG_SIZE, decode_image, preprocess_image
+from classify_folder import find_images
+from decode_pool import DecodePool
+
+def decode_one(data, draft_size):
+    return preprocess_image(decode_image(io.BytesIO(data), draft_size=draft_size))
+
+def run_threads(payloads, workers, draft_size):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda data: decode_one(data, draft_size), payloads))
+        return time.perf_counter() - start
+
+def run_pool(payloads, processes, batch_size, draft_size):
+    pool = DecodePool(processes=processes, batch_size=batch_size, depth=3, draft_size=draft_size)
+    try:
+        # Start every worker before timing
+        pool.submit(payloads[:processes]).wait().release()
+        batches = [payloads[start:start + batch_size] for start in range(0, len(payloads), batch_size)]
+        start = time.perf_counter()
+        pending = [pool.submit(batch) for batch in batches[:2]]
+        for position in range(len(batches)):
+            decoded = pending.pop(0).wait()
+            if position + 2 < len(batches):
+                pending.append(pool.submit(batches[position + 2]))
+            decoded.release()
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare thread and process decoding throughput")
+    parser.add_argument('--folder', default='rubbish-data/test')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--draft-size', type=int, default=IMG_SIZE)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    payloads = []
+    for path in find_images(args.folder):
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    print(f"{len(payloads)} images, {os.cpu_count()} CPUs")
+
+    results = []
+    baseline = None
+    for workers in sorted(set(args.processes)):
+        for mode in ('threads', 'processes'):
+            if mode == 'threads':
+                elapsed = run_threads(payloads, workers, args.draft_size)
+            else:
+                elapsed = run_pool(payloads, workers, args.batch_size, args.draft_size)
+            rate = len(payloads) / elapsed
+            baseline = baseline or rate
+            results.append({'mode': mode, 'workers': workers, 'images_per_sec': round(rate, 1),
+                            'speedup': round(rate / baseline, 2)})
+            print(f"{mode:<10} {workers:>2} | {rate:>7.1f} images/s | x{rate / baseline:.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
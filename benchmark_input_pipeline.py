@@ -0,0 +1,139 @@
+"""Epoch time and validation accuracy: ImageDataGenerator vs. the tf.data pipeline.
+
+    python benchmark_input_pipeline.py --data-dir rubbish-data --epochs 3 --train-epochs 3 --output pipeline.json
+
+For each pipeline, with the augmentation settings of train_model.py:
+  - input_epoch_s:     time to produce one epoch of augmented training batches, per epoch
+                       (tf.data decodes on the first epoch and reads its cache afterwards)
+  - train_epoch_s:     time per epoch training the phase 1 model (frozen MobileNetV2 + head)
+  - val_accuracy:      validation accuracy after --train-epochs
+The run fails (exit code 1) if tf.data's validation accuracy is more than
+--tolerance below ImageDataGenerator's.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import tensorflow as tf
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.layers import Dense, Dropout, GlobalAveragePooling2D
+from tensorflow.keras.models import Model
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from data_pipeline import DirectoryDataset
+
+IMG_SIZE = 224
+# Same settings as train_model.py
+AUGMENTATION = dict(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    fill_mode='nearest'
+)
+
+def make_inputs(pipeline, data_dir, classes, batch_size):
+    """(train, validation) batch sources for one pipeline"""
+    if pipeline == 'tfdata':
+        train = DirectoryDataset(os.path.join(data_dir, 'train'), classes, IMG_SIZE, batch_size, shuffle=True,
+                                 augmentation=AUGMENTATION)
+        validation = DirectoryDataset(os.path.join(data_dir, 'val'), classes, IMG_SIZE, batch_size)
+        return train, validation
+    normalize = lambda x: x / 127.5 - 1
+    train = ImageDataGenerator(preprocessing_function=normalize, **AUGMENTATION).flow_from_directory(
+        os.path.join(data_dir, 'train'), target_size=(IMG_SIZE, IMG_SIZE), batch_size=batch_size,
+        class_mode='categorical', shuffle=True)
+    validation = ImageDataGenerator(preprocessing_function=normalize).flow_from_directory(
+        os.path.join(data_dir, 'val'), target_size=(IMG_SIZE, IMG_SIZE), batch_size=batch_size,
+        class_mode='categorical', shuffle=False)
+    return train, validation
+
+def input_epoch_times(train, epochs):
+    """Seconds to produce each of `epochs` full passes over the training batches"""
+    times = []
+    for _ in range(epochs):
+        train.reset()
+        start = time.perf_counter()
+        for images, labels in itertools.islice(train, len(train)):
+            pass
+        times.append(time.perf_counter() - start)
+    return times
+
+def phase1_model(num_classes, weights):
+    base_model = MobileNetV2(weights=weights, include_top=False, input_shape=(IMG_SIZE, IMG_SIZE, 3))
+    base_model.trainable = False
+    x = GlobalAveragePooling2D()(base_model.output)
+    x = Dense(512, activation='relu')(x)
+    x = Dropout(0.5)(x)
+    model = Model(inputs=base_model.input, outputs=Dense(num_classes, activation='softmax')(x))
+    model.compile(optimizer=Adam(learning_rate=0.001), loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    def on_train_begin(self, logs=None):
+        self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.perf_counter() - self.start)
+
+def train(pipeline, train_source, validation_source, num_classes, epochs, weights, seed):
+    tf.keras.utils.set_random_seed(seed)
+    model = phase1_model(num_classes, weights)
+    timer = EpochTimer()
+    if pipeline == 'tfdata':
+        history = model.fit(train_source.dataset, validation_data=validation_source.dataset, epochs=epochs,
+                            callbacks=[timer], verbose=2)
+    else:
+        history = model.fit(train_source, steps_per_epoch=len(train_source), validation_data=validation_source,
+                            validation_steps=len(validation_source), epochs=epochs, callbacks=[timer], verbose=2)
+    return timer.times, float(history.history['val_accuracy'][-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Keras and tf.data training input pipelines")
+    parser.add_argument('--data-dir', default='rubbish-data', help="Directory with train/ and val/")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=3, help="Input-only epochs to time")
+    parser.add_argument('--train-epochs', type=int, default=3, help="Phase 1 training epochs (0 = skip)")
+    parser.add_argument('--weights', default='imagenet', help="MobileNetV2 weights ('none' for random)")
+    parser.add_argument('--tolerance', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    train_dir = os.path.join(args.data_dir, 'train')
+    classes = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+    weights = None if args.weights == 'none' else args.weights
+
+    results = {}
+    for pipeline in ('keras', 'tfdata'):
+        train_source, validation_source = make_inputs(pipeline, args.data_dir, classes, args.batch_size)
+        result = {'input_epoch_s': [round(t, 2) for t in input_epoch_times(train_source, args.epochs)]}
+        if args.train_epochs:
+            times, accuracy = train(pipeline, train_source, validation_source, len(classes), args.train_epochs,
+                                    weights, args.seed)
+            result['train_epoch_s'] = [round(t, 2) for t in times]
+            result['val_accuracy'] = round(accuracy, 4)
+        results[pipeline] = result
+        print(f"{pipeline:<7} input epochs {result['input_epoch_s']} s"
+              + (f" | training epochs {result['train_epoch_s']} s | val accuracy {result['val_accuracy']:.4f}"
+                 if args.train_epochs else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.train_epochs and results['tfdata']['val_accuracy'] < results['keras']['val_accuracy'] - args.tolerance:
+        print(f"tf.data validation accuracy is more than {args.tolerance} below ImageDataGenerator's")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
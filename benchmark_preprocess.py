@@ -0,0 +1,97 @@
+"""Micro-benchmark of the preprocessing path, before and after the allocation-free rewrite.
+
+    python benchmark_preprocess.py --width 640 --height 480 --iterations 500 --output preprocess.json
+
+Each case runs on the same synthetic camera frame and records:
+  - us_per_frame:    mean wall time per call, in microseconds
+  - peak_alloc_kb:   peak memory allocated during one call (numpy buffers show up in tracemalloc)
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from classifier import IMG_SIZE, preprocess_image, thread_input_buffer
+
+def legacy_preprocess(image, target_size=(IMG_SIZE, IMG_SIZE)):
+    """The previous preprocess_image: resize, float32 copy, expand_dims, then two full-size temporaries"""
+    if len(image.shape) == 3 and image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    image_resized = cv2.resize(image, target_size)
+    image_array = np.asarray(image_resized, dtype=np.float32)
+    image_array = np.expand_dims(image_array, axis=0)
+    return image_array / 127.5 - 1
+
+def legacy_camera_frame(frame):
+    """Previous per-frame camera work: flip into a new array, copy for the overlay"""
+    frame = cv2.flip(frame, 1)
+    overlay = frame.copy()
+    return frame, overlay
+
+def camera_frame(frame, overlay):
+    """Current per-frame camera work: flip in place, overlay drawn on a reused buffer"""
+    cv2.flip(frame, 1, dst=frame)
+    np.copyto(overlay, frame)
+    return frame, overlay
+
+def measure(fn, iterations):
+    """Return (us_per_frame, peak_alloc_kb) for fn()"""
+    for _ in range(10):
+        fn()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iterations * 1e6, (peak - baseline) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing time and allocations per frame")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    overlay = np.empty_like(frame)
+    inputs = [preprocess_image(frame) for _ in range(args.batch_size)]
+    batch_buffer = np.empty((args.batch_size, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    assert np.array_equal(legacy_preprocess(frame), preprocess_image(frame))
+
+    cases = [
+        ('preprocess', 'before', lambda: legacy_preprocess(frame)),
+        ('preprocess', 'after (new array)', lambda: preprocess_image(frame)),
+        ('preprocess', 'after (reused buffer)', lambda: preprocess_image(frame, out=thread_input_buffer())),
+        ('camera frame', 'before', lambda: legacy_camera_frame(frame)),
+        ('camera frame', 'after', lambda: camera_frame(frame, overlay)),
+        ('batch assembly', 'before', lambda: np.concatenate(inputs, axis=0)),
+        ('batch assembly', 'after', lambda: np.concatenate(inputs, axis=0, out=batch_buffer)),
+    ]
+
+    results = []
+    for stage, variant, fn in cases:
+        us, peak_kb = measure(fn, args.iterations)
+        results.append({'stage': stage, 'variant': variant,
+                        'us_per_frame': round(us, 1), 'peak_alloc_kb': round(peak_kb, 1)})
+        print(f"{stage:<15} {variant:<22} {us:>9.1f} us/frame | peak alloc {peak_kb:>8.1f} KB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
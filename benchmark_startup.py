@@ -0,0 +1,138 @@
+"""Measure how long app.py takes to start serving, for each MODEL_LOADING mode.
+
+    python benchmark_startup.py --modes lazy background preload --output startup.json
+    python benchmark_startup.py --modes background --warmup on off --requests 20
+
+For every mode (and warm-up setting) the app is started in a fresh process and we record:
+  - import_s:        time to `import app` (no server)
+  - first_page_s:    process start until GET / answers
+  - ready_s:         process start until GET /ready answers 200 (model loaded and warmed up)
+  - rss_mb:          resident memory of the server once ready
+  - first_request_ms:  latency of the first POST /upload after /ready
+  - steady_request_ms: median latency of the next --requests uploads
+Every upload is a different image from --images, so the result cache never answers.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+MODES = ('lazy', 'background', 'preload')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def measure_import(mode):
+    """Time `import app` in a clean interpreter"""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    env = dict(os.environ, MODEL_LOADING=mode)
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def http_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+def list_images(directory, count):
+    """First `count` image files under directory, in path order"""
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    if len(paths) < count:
+        raise SystemExit(f"Need {count} images in {directory}, found {len(paths)}")
+    return paths[:count]
+
+def upload_ms(url, path):
+    """POST one image to /upload as multipart/form-data; returns the latency in milliseconds"""
+    boundary = 'benchmark-startup-boundary'
+    with open(path, 'rb') as f:
+        data = f.read()
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(url, data=body,
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+def measure_server(mode, warmup=True, images=(), timeout=300):
+    """Start app.py, poll / and /ready until both respond, then time uploads"""
+    port = free_port()
+    env = dict(os.environ, MODEL_LOADING=mode, PORT=str(port), WARMUP='1' if warmup else '0')
+    base = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'app.py'], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {'first_page_s': None, 'ready_s': None, 'rss_mb': None,
+              'first_request_ms': None, 'steady_request_ms': None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app.py exited with code {process.returncode}")
+            if result['first_page_s'] is None and http_status(base + '/') == 200:
+                result['first_page_s'] = round(time.perf_counter() - start, 3)
+            if result['first_page_s'] is not None and http_status(base + '/ready') == 200:
+                result['ready_s'] = round(time.perf_counter() - start, 3)
+                result['rss_mb'] = round(rss_mb(process.pid), 1)
+                break
+            time.sleep(0.05)
+        if images and result['ready_s'] is not None:
+            latencies = [upload_ms(base + '/upload', path) for path in images]
+            result['first_request_ms'] = round(latencies[0], 1)
+            if len(latencies) > 1:
+                result['steady_request_ms'] = round(statistics.median(latencies[1:]), 1)
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app.py startup time per MODEL_LOADING mode")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--warmup', nargs='+', choices=['on', 'off'], default=['on'],
+                        help="Run with warm-up enabled (WARMUP=1), disabled, or both")
+    parser.add_argument('--images', default=os.path.join('rubbish-data', 'test'), help="Images to upload")
+    parser.add_argument('--requests', type=int, default=20, help="Uploads after the first one (0 = no uploads)")
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    images = list_images(args.images, args.requests + 1) if args.requests else []
+    results = []
+    for mode in args.modes:
+        for warmup in args.warmup:
+            result = {'mode': mode, 'warmup': warmup, 'import_s': round(measure_import(mode), 3)}
+            result.update(measure_server(mode, warmup == 'on', images))
+            results.append(result)
+            print(f"{mode:<11} warm-up {warmup:<3} | import {result['import_s']:>6.2f}s | "
+                  f"first page {result['first_page_s']:>6.2f}s | ready {result['ready_s']:>6.2f}s | "
+                  f"RSS {result['rss_mb']:>7.1f} MB"
+                  + (f" | first request {result['first_request_ms']:>7.1f} ms | "
+                     f"steady {result['steady_request_ms']:>7.1f} ms" if images else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
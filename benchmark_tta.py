@@ -0,0 +1,66 @@
+"""Accuracy gain vs. cost of test-time augmentation on the test split.
+
+    python benchmark_tta.py --test-dir rubbish-data/test --engine tflite-int8 --variants 1 2 4 8
+
+For every variant count (first N of classifier.TTA_AUGMENTATIONS, one batch per
+image, predictions averaged) we record:
+  - accuracy / accuracy_gain:  top-1 accuracy, and its change vs. a single pass
+  - ms_per_image / cost:       preprocess + inference time per image, and its ratio vs. a single pass
+Each image is decoded once and reused for every variant count.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from classifier import (CLASS_NAMES_PATH, IMG_SIZE, TTA_AUGMENTATIONS, TTA_CROP, load_class_names, load_image_file,
+                        preprocess_tta)
+from compare_engines import labeled_images
+from inference_engine import DEFAULT_ENGINE, ENGINE_PATHS, create_engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure TTA accuracy gain and cost")
+    parser.add_argument('--test-dir', default='rubbish-data/test')
+    parser.add_argument('--engine', default=DEFAULT_ENGINE, choices=list(ENGINE_PATHS))
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--variants', type=int, nargs='+', default=[1, 2, 4, len(TTA_AUGMENTATIONS)])
+    parser.add_argument('--limit', type=int, default=None, help="Evenly spaced subset of the test images")
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    class_names = load_class_names(CLASS_NAMES_PATH)
+    samples = labeled_images(args.test_dir, class_names, args.limit)
+    # Decoded like a TTA upload: the crops still need IMG_SIZE pixels
+    images = [(load_image_file(path, int(IMG_SIZE / TTA_CROP)), label) for path, label in samples]
+    engine = create_engine(args.engine, args.model)
+    # Warm up every batch shape before timing
+    for count in args.variants:
+        engine.predict(preprocess_tta(images[0][0], count))
+
+    results = []
+    for count in args.variants:
+        correct = 0
+        elapsed = 0.0
+        for image, label in images:
+            start = time.perf_counter()
+            predictions = np.asarray(engine.predict(preprocess_tta(image, count))).mean(axis=0)
+            elapsed += time.perf_counter() - start
+            correct += int(np.argmax(predictions) == label)
+        results.append({'variants': count, 'augmentations': list(TTA_AUGMENTATIONS[:count]),
+                        'accuracy': correct / len(images), 'ms_per_image': elapsed / len(images) * 1000})
+
+    baseline = results[0]
+    print(f"{len(images)} images, {args.engine} engine")
+    for result in results:
+        result['accuracy_gain'] = result['accuracy'] - baseline['accuracy']
+        result['cost'] = result['ms_per_image'] / baseline['ms_per_image']
+        print(f"{result['variants']:>2} variants | accuracy {result['accuracy']:.4f} "
+              f"({result['accuracy_gain']:+.4f}) | {result['ms_per_image']:>7.1f} ms/image (x{result['cost']:.2f})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Measure latency and peak memory of decoding an upload, full-resolution vs. draft mode.
+
+    python benchmark_upload.py --image photo.jpg --iterations 10 --output upload.json
+
+Without --image a synthetic 12 MP (4032x3024) JPEG is generated. Each variant runs
+in a fresh process and we record:
+  - decode_ms:       decode to a numpy array
+  - preprocess_ms:   resize + normalize to the model input
+  - save_ms:         time the request thread spends saving the original
+  - request_ms:      decode + preprocess + save, i.e. what /upload waits for (no inference)
+  - peak_rss_mb:     peak resident memory growth over the process baseline
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+VARIANTS = ('full', 'draft')
+
+def make_test_image(path, width=4032, height=3024):
+    """Write a photo-like JPEG (smooth gradients plus sensor-style noise)"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 12, (height, width, 1)).astype(np.float32)
+    image = np.clip(base + noise, 0, 255).astype(np.uint8)
+    Image.fromarray(image).save(path, quality=92)
+
+def reset_peak_rss():
+    """Reset the kernel's high-water mark so only the measured loop counts (Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    # VmHWM is per process image; ru_maxrss would include the parent's peak across exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def run_variant(variant, image_path, iterations):
+    """Run in a child process: time each stage the way /upload performs it"""
+    import numpy as np
+    from PIL import Image
+    from classifier import IMG_SIZE, decode_image, preprocess_image
+
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    out_dir = tempfile.mkdtemp()
+    reset_peak_rss()
+    baseline = rss_mb()
+
+    timings = {'decode_ms': [], 'preprocess_ms': [], 'save_ms': [], 'request_ms': []}
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        if variant == 'full':
+            # Previous /upload: full-resolution decode, then re-encode the original in the request
+            img = Image.open(io.BytesIO(data))
+            image = np.array(img)
+        else:
+            image = decode_image(io.BytesIO(data), draft_size=IMG_SIZE)
+        t1 = time.perf_counter()
+        preprocess_image(image)
+        t2 = time.perf_counter()
+        if variant == 'full':
+            img.save(os.path.join(out_dir, f'{i}.jpg'))
+        # draft: the original bytes are handed to the background writer, nothing to wait for
+        t3 = time.perf_counter()
+        timings['decode_ms'].append((t1 - t0) * 1000)
+        timings['preprocess_ms'].append((t2 - t1) * 1000)
+        timings['save_ms'].append((t3 - t2) * 1000)
+        timings['request_ms'].append((t3 - t0) * 1000)
+
+    result = {name: round(sorted(values)[len(values) // 2], 1) for name, values in timings.items()}
+    result['decoded_shape'] = list(image.shape)
+    result['peak_rss_mb'] = round(peak_rss_mb() - baseline, 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload decoding latency and memory")
+    parser.add_argument('--image', default=None, help="JPEG to test with (default: synthetic 12 MP photo)")
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    parser.add_argument('--child', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_variant(args.child, args.image, args.iterations)))
+        return
+
+    image_path = args.image
+    if image_path is None:
+        image_path = os.path.join(tempfile.mkdtemp(), 'photo_12mp.jpg')
+        make_test_image(image_path)
+    print(f"Input: {image_path} ({os.path.getsize(image_path) / 1e6:.1f} MB)")
+
+    results = []
+    for variant in args.variants:
+        out = subprocess.run([sys.executable, __file__, '--child', variant, '--image', image_path,
+                              '--iterations', str(args.iterations)],
+                             capture_output=True, text=True, check=True)
+        result = {'variant': variant, **json.loads(out.stdout.strip().splitlines()[-1])}
+        results.append(result)
+        print(f"{variant:<6} decode {result['decode_ms']:>7.1f} ms | preprocess {result['preprocess_ms']:>5.1f} ms | "
+              f"save {result['save_ms']:>6.1f} ms | request {result['request_ms']:>7.1f} ms | "
+              f"peak RSS +{result['peak_rss_mb']:>6.1f} MB | decoded {result['decoded_shape']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
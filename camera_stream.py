@@ -0,0 +1,270 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from camera_sync import FrameRingBuffer, LatestFrameSlot, LatestValueChannel
+from frame_filter import FrameChangeDetector
+from rate_controller import ClassificationRateController
+
+logger = logging.getLogger(__name__)
+
+
+def parse_camera_sources(spec):
+    """Parse CAMERA_SOURCES, e.g. "0" or "front=0,line2=rtsp://host/stream,demo=videos/belt.mp4"
+
+    Returns an ordered {stream_id: source} dict. Sources without a name use the
+    source itself as the id ("0" -> stream "0").
+    """
+    sources = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, source = item.partition('=')
+        if not separator or '://' in name:
+            name, source = item, item
+        sources[name.strip()] = source.strip()
+    return sources
+
+
+def open_source(source):
+    """Device indices become ints for cv2.VideoCapture; URLs and file paths stay strings"""
+    return int(source) if str(source).isdigit() else source
+
+
+def mask_credentials(source):
+    """Hide user:password in RTSP/HTTP URLs before they appear in API output or logs"""
+    return re.sub(r'//[^/@]+@', '//***@', str(source))
+
+
+class CameraStream:
+    """One video source with its own capture and classification threads
+
+    The capture thread reads frames and publishes them for viewers; frames chosen by
+    the rate controller and frame-change detector go through a single-slot hand-off
+    to this stream's classifier thread. classify_frame is shared by every stream and
+    runs through the app's batched inference scheduler, so N streams cost one model.
+    A third thread encodes each frame to JPEG once, with the prediction overlay, into
+    a ring buffer read by every /video_feed viewer; it idles while nobody is watching.
+    """
+
+    def __init__(self, stream_id, source, classify_frame, width=640, height=480,
+                 target_freshness_ms=300.0, cpu_budget=0.5,
+                 change_threshold=4.0, max_reuse_seconds=10.0,
+                 output_width=0, output_height=0, jpeg_quality=80, format_label=None):
+        self.stream_id = stream_id
+        self.source = open_source(source)
+        # Only local webcams are mirrored; RTSP streams and files are shown as recorded
+        self.mirror = isinstance(self.source, int)
+        self.is_file = isinstance(self.source, str) and '://' not in self.source
+        self.classify_frame = classify_frame
+        self.width = width
+        self.height = height
+        # Size of the encoded video feed (0 = keep the capture size)
+        self.output_width = output_width
+        self.output_height = output_height
+        self.jpeg_quality = jpeg_quality
+        self.format_label = format_label or (lambda p: f"{p['class_name']}: {p['confidence']}%")
+
+        self.camera = None
+        self.active = False
+        self.current_frame = None
+        self.frames = LatestValueChannel()
+        self.frame_slot = LatestFrameSlot()
+        self.latest_prediction = {'class_name': 'Unknown', 'confidence': 0.0}
+        self.predictions = LatestValueChannel(self.latest_prediction)
+        self.rate_controller = ClassificationRateController(target_freshness_ms=target_freshness_ms,
+                                                            cpu_budget=cpu_budget)
+        self.frame_detector = FrameChangeDetector(threshold=change_threshold,
+                                                  max_reuse_seconds=max_reuse_seconds)
+        self.encoded = FrameRingBuffer()
+        self.encoded_frames = 0
+        self._encode_times = deque(maxlen=100)
+        # Frame the overlay is drawn on; reused by the encoder thread
+        self._overlay = None
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._capture_thread = None
+
+    def start(self):
+        """Open the source and start the capture/classifier threads; False if unavailable"""
+        with self._lock:
+            if self.active:
+                return True
+            if self._capture_thread is not None and self._capture_thread.is_alive():
+                # The last capture thread is still blocked in read(); it releases the camera on exit
+                logger.warning(f"Stream {self.stream_id} is still stopping, not restarted")
+                return False
+            self.camera = self._open_capture()
+            if self.camera is None:
+                return False
+            self.active = True
+            self._capture_thread = threading.Thread(target=self._capture_loop, name=f'capture-{self.stream_id}',
+                                                    daemon=True)
+            self._threads = [
+                self._capture_thread,
+                threading.Thread(target=self._classify_loop, name=f'classify-{self.stream_id}', daemon=True),
+                threading.Thread(target=self._encode_loop, name=f'encode-{self.stream_id}', daemon=True)
+            ]
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Stream {self.stream_id} started ({mask_credentials(self.source)})")
+            return True
+
+    def stop(self):
+        """Stop the threads; the capture thread releases the capture device once it exits"""
+        with self._lock:
+            self.active = False
+            self.frame_slot.clear()
+            self.frame_slot.wake()
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=2.0)
+            self._threads = []
+            self.frame_detector.reset()
+            self.rate_controller.reset()
+
+    def _open_capture(self):
+        """Open and configure the source (on start and on every reconnect); None if unavailable"""
+        import cv2
+        camera = cv2.VideoCapture(self.source)
+        if isinstance(self.source, int):
+            camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, 2)
+        if not camera.isOpened():
+            logger.error(f"Could not open camera for stream {self.stream_id}")
+            camera.release()
+            return None
+        return camera
+
+    def _release(self):
+        if self.camera is not None:
+            self.camera.release()
+            self.camera = None
+            logger.info(f"Camera resources released for stream {self.stream_id}")
+
+    def _capture_loop(self):
+        try:
+            self._capture_frames()
+        finally:
+            # Only this thread reads from the camera, so release it here, never while read() runs
+            self._release()
+
+    def _capture_frames(self):
+        import cv2
+        while self.active:
+            if self.camera is None:
+                # Reconnect, retrying every second until the source is back
+                self.camera = self._open_capture()
+                if self.camera is None:
+                    time.sleep(1.0)
+                continue
+            success, frame = self.camera.read()
+            if not success:
+                if self.is_file:
+                    # Loop recorded videos so they behave like a live feed
+                    self.camera.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                logger.error(f"Couldn't read frame from stream {self.stream_id}, reconnecting")
+                self._release()
+                time.sleep(1.0)
+                continue
+
+            if self.mirror:
+                # Flip camera horizontally (mirror effect), in place
+                cv2.flip(frame, 1, dst=frame)
+
+            if self.is_file:
+                # Pace file playback at its native frame rate
+                fps = self.camera.get(cv2.CAP_PROP_FPS) or 25
+                time.sleep(1.0 / fps)
+
+            self.current_frame = frame
+            self.frames.publish(frame)
+            self.rate_controller.record_frame()
+
+            # Only send some frames for classification: as often as the rate controller allows,
+            # and not when the scene is unchanged (latest_prediction is reused instead)
+            if self.rate_controller.should_submit() and self.frame_detector.has_changed(frame):
+                self.rate_controller.record_submit()
+                self.frame_slot.put(frame)
+
+    def _classify_loop(self):
+        logger.info(f"Classification thread started for stream {self.stream_id}")
+        while self.active:
+            # Block until the capture loop hands over a frame (or we are woken to stop)
+            image = self.frame_slot.get(timeout=1.0)
+            if image is None:
+                continue
+            started = time.perf_counter()
+            self.latest_prediction = self.classify_frame(image)
+            self.rate_controller.record_inference(time.perf_counter() - started)
+            self.predictions.publish(self.latest_prediction)
+        logger.info(f"Classification thread stopped for stream {self.stream_id}")
+
+    def encode_frame(self, frame):
+        """Resize, draw the latest prediction and JPEG-encode one frame"""
+        import cv2
+        # Draw on a reused buffer; the captured frame is shared with the classifier
+        shape = ((self.output_height, self.output_width) + frame.shape[2:]
+                 if self.output_width and self.output_height else frame.shape)
+        if self._overlay is None or self._overlay.shape != shape or self._overlay.dtype != frame.dtype:
+            self._overlay = np.empty(shape, dtype=frame.dtype)
+        if shape == frame.shape:
+            np.copyto(self._overlay, frame)
+        else:
+            cv2.resize(frame, (self.output_width, self.output_height), dst=self._overlay,
+                       interpolation=cv2.INTER_AREA)
+        frame = self._overlay
+        cv2.putText(frame, self.format_label(self.latest_prediction), (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buffer.tobytes() if ret else None
+
+    def _encode_loop(self):
+        sequence = 0
+        while self.active:
+            update = self.frames.wait(sequence, timeout=1.0)
+            if update is None:
+                continue
+            sequence, frame = update
+            # Nobody is watching: skip the encode cost entirely
+            if not self.encoded.viewers:
+                continue
+            started = time.perf_counter()
+            try:
+                data = self.encode_frame(frame)
+            except Exception as e:
+                logger.error(f"Error encoding frame for stream {self.stream_id}: {e}")
+                continue
+            self._encode_times.append(time.perf_counter() - started)
+            if data is not None:
+                self.encoded_frames += 1
+                self.encoded.append(data)
+
+    def get_stats(self):
+        """Per-stream state, frame rate, inference latency and frame filter counters"""
+        rate = self.rate_controller.get_stats()
+        encode_times = np.array(self._encode_times) * 1000 if self._encode_times else None
+        return {
+            'stream_id': self.stream_id,
+            'source': mask_credentials(self.source),
+            'active': self.active,
+            'fps': rate['camera_fps'],
+            'inference_latency_ms': rate['inference_latency_ms'],
+            'latest_prediction': self.latest_prediction,
+            'classification_rate': rate,
+            'frame_filter': self.frame_detector.get_stats(),
+            'dropped_frames': self.frame_slot.dropped,
+            'viewers': self.encoded.viewers,
+            'encoded_frames': self.encoded_frames,
+            'encode_ms': round(float(encode_times.mean()), 2) if encode_times is not None else None,
+            'encode_p95_ms': round(float(np.percentile(encode_times, 95)), 2) if encode_times is not None else None,
+            'viewer_dropped_frames': self.encoded.dropped
+        }
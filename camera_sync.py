@@ -0,0 +1,116 @@
+import threading
+from collections import deque
+
+
+class LatestFrameSlot:
+    """Single-slot hand-off from the capture loop to the classifier
+
+    put() overwrites whatever frame has not been picked up yet, so the classifier
+    always gets the newest frame; get() blocks on a condition variable instead of
+    polling, so an idle classifier thread costs no wakeups.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self.dropped = 0
+
+    def put(self, frame):
+        """Store a frame for the classifier, replacing any unconsumed one"""
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Wait for a frame and take it; returns None on timeout or wake()"""
+        with self._condition:
+            if self._frame is None:
+                self._condition.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+    def wake(self):
+        """Release a waiting consumer, e.g. so it can notice it should stop"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def clear(self):
+        """Discard any pending frame"""
+        with self._condition:
+            self._frame = None
+
+
+class LatestValueChannel:
+    """Broadcast the newest value (a prediction, a frame) to any number of waiting subscribers"""
+
+    def __init__(self, initial=None):
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._value = initial
+
+    def publish(self, value):
+        """Store a new value and wake every subscriber"""
+        with self._condition:
+            self._sequence += 1
+            self._value = value
+            self._condition.notify_all()
+
+    def latest(self):
+        """Return (sequence, value) for the current value"""
+        with self._condition:
+            return self._sequence, self._value
+
+    def wait(self, after_sequence, timeout=None):
+        """Block until a value newer than after_sequence exists; None on timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > after_sequence, timeout):
+                return None
+            return self._sequence, self._value
+
+
+class FrameRingBuffer:
+    """Fixed-size ring of encoded frames shared by every viewer of a stream
+
+    The encoder appends each JPEG once and every viewer keeps its own read position.
+    A viewer that falls more than `capacity` frames behind skips ahead to the oldest
+    frame still buffered, so a slow client drops frames instead of holding back the
+    encoder or the other viewers.
+    """
+
+    def __init__(self, capacity=4):
+        self._condition = threading.Condition()
+        self._frames = deque(maxlen=capacity)
+        self._sequence = 0
+        self.viewers = 0
+        self.dropped = 0
+
+    def append(self, data):
+        """Add an encoded frame, overwriting the oldest one, and wake every viewer"""
+        with self._condition:
+            self._sequence += 1
+            self._frames.append((self._sequence, data))
+            self._condition.notify_all()
+
+    def add_viewer(self):
+        """Register a viewer; returns the read position to pass to the first read()"""
+        with self._condition:
+            self.viewers += 1
+            # Start from the newest buffered frame rather than replaying old ones
+            return max(0, self._sequence - 1)
+
+    def remove_viewer(self):
+        """Unregister a viewer, e.g. when its HTTP connection closes"""
+        with self._condition:
+            self.viewers = max(0, self.viewers - 1)
+
+    def read(self, after_sequence, timeout=None):
+        """Block until a frame newer than after_sequence exists; returns (sequence, data) or None"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > after_sequence, timeout):
+                return None
+            oldest = self._frames[0][0]
+            sequence, data = self._frames[max(after_sequence + 1, oldest) - oldest]
+            self.dropped += sequence - after_sequence - 1
+            return sequence, data
@@ -0,0 +1,222 @@
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Configuration paths
+MODEL_PATH = 'model/trash_classification_model.h5'
+CLASS_NAMES_PATH = 'model/class_names.txt'
+# Softmax temperature fitted on the validation set by train_model.py
+CALIBRATION_PATH = 'model/calibration.json'
+IMG_SIZE = 224
+
+DEFAULT_CLASS_NAMES = ['battery', 'biological', 'brown-glass', 'cardboard', 'green-glass',
+                       'metal', 'paper', 'plastic', 'trash', 'white-glass']
+
+# Files the folder and dataset loaders pick up (all formats decode_image reads)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+# Test-time augmentations, most useful first; mirrors train_generator's flip, zoom and shifts
+TTA_AUGMENTATIONS = ('original', 'flip', 'zoom', 'zoom-flip', 'shift-left', 'shift-right', 'shift-up', 'shift-down')
+# Fraction of each side kept by the zoom/shift crops (zoom_range and shift ranges are 0.2)
+TTA_CROP = 0.8
+
+# class_name reported when the calibrated confidence is below the abstain threshold
+UNCERTAIN_CLASS = 'uncertain'
+
+def load_class_names(path=CLASS_NAMES_PATH):
+    """Read class names written by train_model.py, falling back to the default list"""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return [line.strip() for line in f.readlines()]
+    else:
+        logger.warning(f"File {path} not found. Using default class list.")
+        return list(DEFAULT_CLASS_NAMES)
+
+def load_temperature(path=CALIBRATION_PATH):
+    """Read the calibration temperature written by train_model.py (1.0 = uncalibrated)"""
+    if not os.path.exists(path):
+        logger.info(f"File {path} not found. Confidences are not calibrated.")
+        return 1.0
+    with open(path, 'r') as f:
+        return float(json.load(f)['temperature'])
+
+def apply_temperature(probabilities, temperature):
+    """Temperature-scale softmax outputs: softmax(logits / T), recovered from the probabilities
+
+    log(p) equals the logits up to a per-row constant, which softmax ignores, so this
+    is exact for a softmax output layer. Rows keep their argmax for any T > 0.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if temperature == 1.0:
+        return probabilities
+    logits = np.log(np.clip(probabilities, 1e-12, None)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    scaled = np.exp(logits)
+    return scaled / scaled.sum(axis=-1, keepdims=True)
+
+def calibration_nll(probabilities, labels, temperature):
+    """Mean negative log-likelihood of the true labels after temperature scaling"""
+    scaled = apply_temperature(probabilities, temperature)
+    return float(-np.mean(np.log(np.clip(scaled[np.arange(len(labels)), labels], 1e-12, None))))
+
+def fit_temperature(probabilities, labels, low=0.05, high=20.0, iterations=60):
+    """Temperature minimizing the validation NLL (golden-section search on 1/T, where it is convex)"""
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = 1.0 / high, 1.0 / low
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = calibration_nll(probabilities, labels, 1 / c), calibration_nll(probabilities, labels, 1 / d)
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = calibration_nll(probabilities, labels, 1 / c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = calibration_nll(probabilities, labels, 1 / d)
+    return float(2 / (a + b))
+
+def decode_image(fp, draft_size=None):
+    """Decode an image file or stream into a numpy array (RGB or RGBA)
+
+    With draft_size the image is never materialised at full resolution: JPEGs are
+    decoded at a reduced DCT scale (1/2 to 1/8) and anything still more than twice
+    draft_size is box-reduced, keeping both sides >= draft_size.
+    """
+    img = Image.open(fp)
+    if draft_size:
+        img.draft('RGB', (draft_size, draft_size))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if draft_size:
+        factor = min(img.size) // draft_size
+        if factor > 1:
+            img = img.reduce(factor)
+    return np.array(img)
+
+def load_image_file(path, draft_size=IMG_SIZE):
+    """Read an image file into a numpy array the same way /upload decodes uploads (default UPLOAD_DECODE_SIZE)"""
+    return decode_image(path, draft_size)
+
+# Per-thread scratch buffers so steady-state preprocessing allocates nothing
+_buffers = threading.local()
+
+def _thread_buffer(name, shape, dtype):
+    """Return a reusable array owned by the calling thread, reallocated only if the shape changes"""
+    buffer = getattr(_buffers, name, None)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = np.empty(shape, dtype=dtype)
+        setattr(_buffers, name, buffer)
+    return buffer
+
+def thread_input_buffer(target_size=(IMG_SIZE, IMG_SIZE)):
+    """Reusable (1, H, W, 3) float32 model input for the calling thread
+
+    Only safe when the previous input is no longer needed, e.g. after a synchronous predict.
+    """
+    return _thread_buffer('input', (1, target_size[1], target_size[0], 3), np.float32)
+
+def preprocess_image(image, target_size=(IMG_SIZE, IMG_SIZE), out=None, bgr=False):
+    """Preprocess image for model input
+
+    Resize, alpha removal and scaling to [-1, 1] are fused into a single pass that
+    writes straight into `out`, a preallocated (1, H, W, 3) float32 array such as
+    thread_input_buffer() or a slice of a batch; without `out` a new array is returned.
+    The model expects RGB: pass bgr=True for OpenCV frames (camera captures), which
+    are converted after resizing, into another per-thread scratch image.
+    """
+    # Imported here so modules that never preprocess don't pay for OpenCV at startup
+    import cv2
+    try:
+        if image is None:
+            logger.error("Input image is empty")
+            return None
+
+        if out is None:
+            out = np.empty((1, target_size[1], target_size[0], 3), dtype=np.float32)
+
+        # Resize into a per-thread scratch image (all channels; alpha is dropped below)
+        channels = image.shape[2] if image.ndim == 3 else 1
+        shape = (target_size[1], target_size[0], channels) if channels > 1 else (target_size[1], target_size[0])
+        image_resized = cv2.resize(image, target_size, dst=_thread_buffer('resized', shape, image.dtype))
+        if image_resized.ndim == 2:
+            # Grayscale: broadcast the single channel to RGB
+            image_resized = image_resized[..., np.newaxis]
+        elif bgr:
+            code = cv2.COLOR_BGRA2RGB if channels == 4 else cv2.COLOR_BGR2RGB
+            rgb_shape = (target_size[1], target_size[0], 3)
+            image_resized = cv2.cvtColor(image_resized, code, dst=_thread_buffer('rgb', rgb_shape, image.dtype))
+
+        # Normalize similar to training: x / 127.5 - 1, computed in float32 directly into the output
+        np.divide(image_resized[..., :3], 127.5, out=out[0], dtype=np.float32)
+        np.subtract(out, 1, out=out)
+
+        return out
+    except Exception as e:
+        logger.error(f"Error preprocessing image: {e}")
+        return None
+
+def _tta_crop(image, augmentation):
+    """View of the TTA_CROP window for a zoom or shift augmentation"""
+    height, width = image.shape[:2]
+    crop_height, crop_width = max(1, int(height * TTA_CROP)), max(1, int(width * TTA_CROP))
+    top, left = (height - crop_height) // 2, (width - crop_width) // 2
+    if augmentation == 'shift-left':
+        left = 0
+    elif augmentation == 'shift-right':
+        left = width - crop_width
+    elif augmentation == 'shift-up':
+        top = 0
+    elif augmentation == 'shift-down':
+        top = height - crop_height
+    return image[top:top + crop_height, left:left + crop_width]
+
+def preprocess_tta(image, count, target_size=(IMG_SIZE, IMG_SIZE), out=None, bgr=False):
+    """Preprocess the first `count` TTA_AUGMENTATIONS of image into one (count, H, W, 3) batch
+
+    Crops are taken from the full-resolution image; flips reuse the preceding row.
+    Average the model outputs over the batch to get the TTA prediction.
+    """
+    count = max(1, min(count, len(TTA_AUGMENTATIONS)))
+    if out is None:
+        out = np.empty((count, target_size[1], target_size[0], 3), dtype=np.float32)
+    for index, augmentation in enumerate(TTA_AUGMENTATIONS[:count]):
+        if augmentation.endswith('flip'):
+            np.copyto(out[index], out[index - 1, :, ::-1])
+            continue
+        source = image if augmentation == 'original' or image is None else _tta_crop(image, augmentation)
+        if preprocess_image(source, target_size, out=out[index:index + 1], bgr=bgr) is None:
+            return None
+    return out
+
+def prediction_to_result(predictions, class_names, temperature=1.0, top_k=0, uncertain_threshold=0.0):
+    """Convert one row of model output into the API result format
+
+    Probabilities are calibrated with `temperature` first. top_k > 0 adds the k most
+    likely classes (best first), and a confidence below `uncertain_threshold` percent
+    reports class_name 'uncertain'; the best guess is still top_k[0].
+    """
+    probabilities = apply_temperature(predictions, temperature)
+    class_index = np.argmax(probabilities)
+    confidence = round(float(probabilities[class_index]) * 100, 2)
+    result = {
+        'class_name': class_names[class_index] if confidence >= uncertain_threshold else UNCERTAIN_CLASS,
+        'confidence': confidence
+    }
+    if top_k:
+        result['top_k'] = [{'class_name': name, 'confidence': round(probability * 100, 2)}
+                           for name, probability in top_k_predictions(probabilities, class_names, top_k)]
+    return result
+
+def top_k_predictions(predictions, class_names, k=3):
+    """Return the k most likely (class_name, probability) pairs, best first"""
+    k = min(k, len(predictions))
+    # Stable descending order, so ties rank like np.argmax and top_k[0] is the reported class
+    indices = np.argsort(-np.asarray(predictions), kind='stable')[:k]
+    return [(class_names[i], float(predictions[i])) for i in indices]
@@ -0,0 +1,222 @@
+"""Offline bulk classification of an image directory tree.
+
+Example:
+    python classify_folder.py rubbish-data/test --output results.csv --top-k 3
+
+Rows are appended to the output after every batch, so an interrupted run can be
+restarted with the same command and will skip images that are already listed.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from classifier import (CALIBRATION_PATH, CLASS_NAMES_PATH, IMAGE_EXTENSIONS, IMG_SIZE, apply_temperature,
+                        load_class_names, load_image_file, load_temperature, preprocess_image,
+                        prediction_to_result, top_k_predictions)
+from decode_pool import DecodePool
+from inference_engine import DEFAULT_ENGINE, ENGINE_PATHS, create_engine
+
+def find_images(root):
+    """Walk a directory tree and return image paths in a stable order"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(dirpath, filename))
+    return paths
+
+def result_columns(top_k):
+    """CSV header for the given number of top-k columns"""
+    columns = ['path', 'class_name', 'confidence']
+    for i in range(1, top_k + 1):
+        columns += [f'top{i}_class', f'top{i}_probability']
+    return columns
+
+def read_done_paths(csv_path):
+    """Return the set of paths already written by a previous (interrupted) run"""
+    if not os.path.exists(csv_path):
+        return set()
+    with open(csv_path, newline='') as f:
+        return {row['path'] for row in csv.DictReader(f)}
+
+def decode_and_preprocess(path, out=None):
+    """Worker task: read one file into its (1, 224, 224, 3) slot of the batch buffer; returns it, or None"""
+    try:
+        return preprocess_image(load_image_file(path), out=out)
+    except Exception as e:
+        print(f"Skipping {path}: {e}")
+        return None
+
+def chunked(items, size):
+    """Split a list into consecutive batches"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def classify_folder(input_dir, output, engine=DEFAULT_ENGINE, model_path=None,
+                    class_names_path=CLASS_NAMES_PATH, batch_size=32, workers=None, top_k=3,
+                    overwrite=False, processes=0, calibration_path=CALIBRATION_PATH, uncertain_threshold=0.0):
+    """Classify every image under input_dir and write one result row per image
+
+    Images are decoded by `workers` threads, or with processes > 0 by a pool of
+    worker processes writing into shared memory (no GIL contention with inference).
+    Probabilities are temperature-calibrated when calibration_path exists; rows below
+    uncertain_threshold percent get class_name 'uncertain' (top1 keeps the best guess).
+    """
+    stats = {
+        'images': 0,
+        'skipped': 0,
+        'failed': 0,
+        'model_load_s': 0.0,
+        'decode_wait_s': 0.0,
+        'inference_s': 0.0,
+        'write_s': 0.0,
+    }
+    workers = workers or os.cpu_count() or 1
+
+    # Parquet cannot be appended to, so progress is always checkpointed as CSV
+    write_parquet = output.lower().endswith('.parquet')
+    csv_path = output + '.partial.csv' if write_parquet else output
+    if overwrite and os.path.exists(csv_path):
+        os.remove(csv_path)
+
+    paths = find_images(input_dir)
+    done = read_done_paths(csv_path)
+    todo = [p for p in paths if p not in done]
+    stats['skipped'] = len(paths) - len(todo)
+    print(f"Found {len(paths)} images, {stats['skipped']} already classified, {len(todo)} to go")
+
+    start = time.perf_counter()
+    model = create_engine(engine, model_path)
+    class_names = load_class_names(class_names_path)
+    temperature = load_temperature(calibration_path)
+    stats['model_load_s'] = time.perf_counter() - start
+
+    columns = result_columns(top_k)
+    new_file = not os.path.exists(csv_path)
+    run_start = time.perf_counter()
+
+    with open(csv_path, 'a', newline='') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(columns)
+
+        batches = list(chunked(todo, batch_size))
+        # Workers preprocess straight into preallocated batch buffers. Three rotate:
+        # one running through the model while the next two batches are decoded
+        if processes:
+            pool = DecodePool(processes=processes, batch_size=batch_size, depth=3, draft_size=IMG_SIZE)
+        else:
+            buffers = [np.empty((batch_size, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32) for _ in range(3)]
+
+        def submit_batch(index):
+            if processes:
+                return pool.submit(batches[index])
+            buffer = buffers[index % len(buffers)]
+            return [executor.submit(decode_and_preprocess, path, buffer[i:i + 1])
+                    for i, path in enumerate(batches[index])]
+
+        pending = [submit_batch(index) for index in range(min(2, len(batches)))]
+        for batch_index, batch in enumerate(batches):
+            t0 = time.perf_counter()
+            current = pending.pop(0)
+            if processes:
+                current.wait()
+                for path, error in zip(batch, current.errors):
+                    if error is not None:
+                        print(f"Skipping {path}: {error}")
+                ok = np.array([error is None for error in current.errors])
+                batch_inputs = current.inputs
+            else:
+                ok = np.array([future.result() is not None for future in current])
+                batch_inputs = buffers[batch_index % len(buffers)][:len(batch)]
+            if batch_index + 2 < len(batches):
+                pending.append(submit_batch(batch_index + 2))
+            t1 = time.perf_counter()
+
+            valid = [path for path, good in zip(batch, ok) if good]
+            stats['failed'] += len(batch) - len(valid)
+            predictions = []
+            if valid:
+                # Only failed images force a compacting copy
+                predictions = model.predict(batch_inputs if ok.all() else batch_inputs[ok])
+            if processes:
+                current.release()
+            t2 = time.perf_counter()
+
+            for path, row in zip(valid, predictions):
+                row = apply_temperature(row, temperature)
+                result = prediction_to_result(row, class_names, uncertain_threshold=uncertain_threshold)
+                line = [path, result['class_name'], result['confidence']]
+                for name, probability in top_k_predictions(row, class_names, top_k):
+                    line += [name, round(probability, 6)]
+                writer.writerow(line)
+            f.flush()
+            t3 = time.perf_counter()
+
+            stats['images'] += len(valid)
+            stats['decode_wait_s'] += t1 - t0
+            stats['inference_s'] += t2 - t1
+            stats['write_s'] += t3 - t2
+
+            elapsed = t3 - run_start
+            print(f"[{stats['images']}/{len(todo)}] {stats['images'] / elapsed:.1f} images/sec")
+
+    if processes:
+        pool.close()
+
+    stats['total_s'] = time.perf_counter() - run_start
+    stats['images_per_sec'] = stats['images'] / stats['total_s'] if stats['total_s'] > 0 else 0.0
+
+    if write_parquet:
+        import pandas as pd
+        pd.read_csv(csv_path).to_parquet(output, index=False)
+        os.remove(csv_path)
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a directory tree of trash images")
+    parser.add_argument('input_dir', help="Directory to walk, e.g. rubbish-data/test")
+    parser.add_argument('--output', default='classification_results.csv',
+                        help="Output file (.csv or .parquet)")
+    parser.add_argument('--engine', default=DEFAULT_ENGINE, choices=list(ENGINE_PATHS),
+                        help="Inference engine (see inference_engine.py)")
+    parser.add_argument('--model', default=None, help="Model file (default: the engine's standard path)")
+    parser.add_argument('--class-names', default=CLASS_NAMES_PATH, help="Path to class_names.txt")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=None, help="Decode worker threads (default: CPU count)")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Decode in this many worker processes via shared memory instead of threads")
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--calibration', default=CALIBRATION_PATH,
+                        help="Temperature file from train_model.py (missing = uncalibrated)")
+    parser.add_argument('--uncertain-threshold', type=float, default=0.0,
+                        help="Report class 'uncertain' below this confidence in percent")
+    parser.add_argument('--overwrite', action='store_true', help="Ignore previous results instead of resuming")
+    parser.add_argument('--stats-json', help="Also write timing stats to this JSON file")
+    args = parser.parse_args()
+
+    stats = classify_folder(args.input_dir, args.output, engine=args.engine, model_path=args.model,
+                            class_names_path=args.class_names, batch_size=args.batch_size,
+                            workers=args.workers, top_k=args.top_k, overwrite=args.overwrite,
+                            processes=args.processes, calibration_path=args.calibration,
+                            uncertain_threshold=args.uncertain_threshold)
+
+    print(f"Classified {stats['images']} images in {stats['total_s']:.1f}s "
+          f"({stats['images_per_sec']:.1f} images/sec), {stats['failed']} failed, "
+          f"{stats['skipped']} skipped (already done)")
+    print(f"Model load: {stats['model_load_s']:.2f}s | waiting on decode: {stats['decode_wait_s']:.2f}s | "
+          f"inference: {stats['inference_s']:.2f}s | writing: {stats['write_s']:.2f}s")
+
+    if args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump(stats, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""Accuracy-parity and latency/memory comparison of the inference engines.
+
+    python compare_engines.py --test-dir rubbish-data/test --tolerance 0.01
+    python compare_engines.py --packed rubbish-data-packed      # test split from pack_dataset.py
+
+Each engine runs in its own process so load time and peak memory are measured
+independently. The Keras model is the reference: every other engine is checked
+for test accuracy, top-1 agreement and probability drift against it, and the
+fastest engine whose accuracy stays within --tolerance of Keras is recommended.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from classifier import CLASS_NAMES_PATH, IMAGE_EXTENSIONS, load_class_names
+from inference_engine import ENGINE_PATHS
+
+def labeled_images(test_dir, class_names, limit=None):
+    """List (path, label index) for every image under test_dir/<class>/"""
+    samples = []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(test_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, filename), label))
+    if limit:
+        # Take an evenly spaced subset so every class stays represented
+        step = max(1, len(samples) // limit)
+        samples = samples[::step][:limit]
+    return samples
+
+def _rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+def benchmark_engine(engine, samples, batch_size, latency_runs, probabilities_path, packed_dir=None):
+    """Child process: load one engine, score the test split and time single-image calls
+
+    With packed_dir the samples are (position, label) in its test split; the packed images
+    are already resized, so only scaling to [-1, 1] remains.
+    """
+    from classifier import load_image_file, preprocess_image
+    from inference_engine import create_engine
+
+    if packed_dir:
+        from pack_dataset import PackedSplit
+        packed = PackedSplit(packed_dir, 'test')
+
+        def load_batch(chunk):
+            images = packed.images([position for position, _ in chunk])
+            return np.divide(images, 127.5, dtype=np.float32) - 1
+    else:
+        def load_batch(chunk):
+            return np.concatenate([preprocess_image(load_image_file(path)) for path, _ in chunk])
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    instance = create_engine(engine)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    # Throughput over the whole split, excluding decode time
+    probabilities = []
+    inference_s = 0.0
+    for offset in range(0, len(samples), batch_size):
+        chunk = samples[offset:offset + batch_size]
+        batch = load_batch(chunk)
+        t = time.perf_counter()
+        probabilities.append(instance.predict(batch))
+        inference_s += time.perf_counter() - t
+    probabilities = np.concatenate(probabilities).astype(np.float32)
+    np.save(probabilities_path, probabilities)
+
+    # Single-image latency (the interactive /upload case), after one warm-up call
+    single = load_batch(samples[:1]).astype(np.float32)
+    instance.predict(single)
+    latencies = []
+    for _ in range(latency_runs):
+        t = time.perf_counter()
+        instance.predict(single)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    labels = np.array([label for _, label in samples])
+    return {
+        'engine': engine,
+        'path': ENGINE_PATHS[engine],
+        'file_size_mb': round(os.path.getsize(ENGINE_PATHS[engine]) / 1e6, 2),
+        'load_s': round(load_s, 3),
+        'accuracy': float(np.mean(np.argmax(probabilities, axis=1) == labels)),
+        'throughput_images_per_sec': round(len(samples) / inference_s, 2),
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'latency_p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'model_memory_mb': round(rss_loaded - rss_before, 1),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+
+def packed_samples(packed_dir, class_names, limit=None):
+    """(position, label) for the packed test split, with labels mapped onto class_names"""
+    from pack_dataset import PackedSplit
+    packed = PackedSplit(packed_dir, 'test')
+    remap = np.array([class_names.index(name) for name in packed.class_names])
+    samples = [(position, int(remap[label])) for position, label in enumerate(packed.labels)]
+    if limit:
+        step = max(1, len(samples) // limit)
+        samples = samples[::step][:limit]
+    return samples
+
+def compare_engines(test_dir, engines, batch_size=32, latency_runs=50, limit=None, tolerance=0.01,
+                    packed_dir=None):
+    """Run every available engine and compare each against the Keras reference"""
+    class_names = load_class_names(CLASS_NAMES_PATH)
+    if packed_dir:
+        samples = packed_samples(packed_dir, class_names, limit)
+        test_dir = os.path.join(packed_dir, 'test')
+    else:
+        samples = labeled_images(test_dir, class_names, limit)
+    print(f"Comparing engines on {len(samples)} images from {test_dir}")
+
+    engines = ['keras'] + [e for e in engines if e != 'keras']
+    results = []
+    work_dir = tempfile.mkdtemp(prefix='engine_compare_')
+    context = multiprocessing.get_context('spawn')
+    for engine in engines:
+        if not os.path.exists(ENGINE_PATHS[engine]):
+            print(f"Skipping {engine}: {ENGINE_PATHS[engine]} not found (run model_export.py)")
+            continue
+        probabilities_path = os.path.join(work_dir, f'{engine}.npy')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(benchmark_engine, engine, samples, batch_size,
+                                     latency_runs, probabilities_path, packed_dir).result()
+        result['probabilities_path'] = probabilities_path
+        results.append(result)
+        print(f"{engine}: accuracy {result['accuracy']:.4f}, p50 {result['latency_p50_ms']} ms, "
+              f"{result['throughput_images_per_sec']} images/sec")
+
+    if not results or results[0]['engine'] != 'keras':
+        raise SystemExit("The Keras reference model is required for the parity check")
+
+    reference = np.load(results[0]['probabilities_path'])
+    for result in results:
+        probabilities = np.load(result.pop('probabilities_path'))
+        result['top1_agreement'] = float(np.mean(np.argmax(probabilities, 1) == np.argmax(reference, 1)))
+        result['max_probability_diff'] = float(np.max(np.abs(probabilities - reference)))
+        result['accuracy_delta'] = result['accuracy'] - results[0]['accuracy']
+        result['within_tolerance'] = result['accuracy_delta'] >= -tolerance
+
+    eligible = [r for r in results if r['within_tolerance']]
+    recommended = min(eligible, key=lambda r: r['latency_p50_ms'])['engine']
+    return {'samples': len(samples), 'tolerance': tolerance, 'recommended': recommended, 'engines': results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Keras, TFLite and ONNX inference engines")
+    parser.add_argument('--test-dir', default=os.path.join('rubbish-data', 'test'))
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINE_PATHS), default=list(ENGINE_PATHS))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--latency-runs', type=int, default=50)
+    parser.add_argument('--packed', default=None,
+                        help="Read the test split from this pack_dataset.py output instead of --test-dir")
+    parser.add_argument('--limit', type=int, default=None, help="Only use this many test images")
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="Maximum allowed accuracy drop versus Keras (absolute, e.g. 0.01 = 1 point)")
+    parser.add_argument('--output', default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = compare_engines(args.test_dir, args.engines, args.batch_size, args.latency_runs,
+                             args.limit, args.tolerance, args.packed)
+
+    print()
+    print(f"{'engine':<12} {'accuracy':>9} {'delta':>7} {'agree':>6} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'img/s':>8} {'model MB':>9} {'peak MB':>8} {'file MB':>8}")
+    for r in report['engines']:
+        print(f"{r['engine']:<12} {r['accuracy']:>9.4f} {r['accuracy_delta']:>+7.4f} {r['top1_agreement']:>6.3f} "
+              f"{r['latency_p50_ms']:>8.2f} {r['latency_p99_ms']:>8.2f} {r['throughput_images_per_sec']:>8.1f} "
+              f"{r['model_memory_mb']:>9.1f} {r['peak_rss_mb']:>8.1f} {r['file_size_mb']:>8.2f}")
+    print(f"\nFastest engine within {args.tolerance:.2%} of Keras accuracy: {report['recommended']}")
+    print(f"Set INFERENCE_ENGINE={report['recommended']} to use it in the apps.")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""tf.data input pipelines for train_model.py (INPUT_PIPELINE=tfdata or packed).
+
+Replaces ImageDataGenerator.flow_from_directory, which decodes and augments one
+image at a time in Python. Here files are decoded and resized in parallel, with
+the same draft decode as /upload (pack_dataset.decode_resized), the uint8 224x224
+images are cached (in memory or in a file) after the first epoch, augmentation
+runs on whole batches as one projective transform, and batches are prefetched
+while the model trains on the previous one.
+
+PackedDataset reads the pre-resized shards written by pack_dataset.py instead,
+so there is no per-file open or decode at all.
+
+Both keep the parts of the DirectoryIterator interface the training script
+relies on (samples, classes, class_indices, directory, len(), reset(),
+iteration), so the pipelines can be swapped behind one flag.
+"""
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from feature_cache import dataset_fingerprint
+from classifier import IMAGE_EXTENSIONS
+from pack_dataset import PackedSplit, decode_resized
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def list_directory(directory, class_names):
+    """(paths, labels) for directory/<class>/* in flow_from_directory's order"""
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(directory, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(label)
+    return paths, np.array(labels, dtype=np.int32)
+
+
+def load_image(path, image_size):
+    """Decode and resize one file to uint8 RGB like /upload and pack_dataset.py do (first frame)"""
+    image = tf.numpy_function(lambda p: decode_resized(p.decode(), image_size), [path], tf.uint8, stateful=False)
+    image.set_shape((image_size, image_size, 3))
+    return image
+
+
+def random_affine_transforms(batch_size, height, width, augmentation):
+    """Per-image projective transforms (output -> input coordinates) for ImageDataGenerator's settings
+
+    Rotation and shear are in degrees, shifts are fractions of the image size and
+    zoom_range scales each axis independently within [1 - z, 1 + z], as in Keras.
+    """
+    def uniform(limit):
+        return tf.random.uniform((batch_size,), -limit, limit)
+
+    theta = uniform(augmentation.get('rotation_range', 0.0)) * math.pi / 180
+    shear = uniform(augmentation.get('shear_range', 0.0)) * math.pi / 180
+    shift_x = uniform(augmentation.get('width_shift_range', 0.0)) * width
+    shift_y = uniform(augmentation.get('height_shift_range', 0.0)) * height
+    zoom = augmentation.get('zoom_range', 0.0)
+    zoom_x = tf.random.uniform((batch_size,), 1 - zoom, 1 + zoom)
+    zoom_y = tf.random.uniform((batch_size,), 1 - zoom, 1 + zoom)
+
+    # A = rotation @ shear @ zoom, applied around the image centre
+    cos, sin = tf.cos(theta), tf.sin(theta)
+    a00 = cos * zoom_x
+    a01 = (-cos * tf.sin(shear) - sin * tf.cos(shear)) * zoom_y
+    a10 = sin * zoom_x
+    a11 = (-sin * tf.sin(shear) + cos * tf.cos(shear)) * zoom_y
+    center_x, center_y = (width - 1) / 2, (height - 1) / 2
+    a02 = center_x - a00 * center_x - a01 * center_y + shift_x
+    a12 = center_y - a10 * center_x - a11 * center_y + shift_y
+    zeros = tf.zeros((batch_size,))
+    return tf.stack([a00, a01, a02, a10, a11, a12, zeros, zeros], axis=1)
+
+
+def augment_batch(images, augmentation):
+    """Random flip plus one affine warp for a whole (N, H, W, 3) float batch"""
+    shape = tf.shape(images)
+    batch_size, height, width = shape[0], shape[1], shape[2]
+    if augmentation.get('horizontal_flip'):
+        flip = tf.random.uniform((batch_size, 1, 1, 1)) < 0.5
+        images = tf.where(flip, tf.reverse(images, axis=[2]), images)
+    transforms = random_affine_transforms(batch_size, tf.cast(height, tf.float32), tf.cast(width, tf.float32),
+                                          augmentation)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images, transforms=transforms, output_shape=shape[1:3], fill_value=0.0,
+        interpolation='BILINEAR', fill_mode=augmentation.get('fill_mode', 'nearest').upper())
+
+
+def finish_batches(dataset, num_classes, augmentation=None):
+    """uint8 (images, labels) batches -> augmented images in [-1, 1] with one-hot labels, prefetched"""
+    def finish(images, labels):
+        images = tf.cast(images, tf.float32)
+        if augmentation:
+            images = augment_batch(images, augmentation)
+        return images / 127.5 - 1, tf.one_hot(labels, num_classes)
+
+    return dataset.map(finish, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+
+class BatchSource:
+    """DirectoryIterator-like wrapper around a finite tf.data dataset of batches"""
+
+    def __len__(self):
+        return math.ceil(self.samples / self.batch_size)
+
+    def __iter__(self):
+        return iter(self.dataset)
+
+    def reset(self):
+        """Nothing to rewind: every iteration starts a new epoch"""
+
+
+class DirectoryDataset(BatchSource):
+    """Batches of (images in [-1, 1], one-hot labels) from directory/<class>/ files
+
+    `cache` is '' to keep the decoded images in memory, or a file prefix to cache them on
+    disk; the prefix gets a hash of the directory listing and image size appended, so a
+    changed dataset is decoded again instead of read from a stale cache.
+    """
+
+    def __init__(self, directory, class_names, image_size=224, batch_size=32, shuffle=False,
+                 augmentation=None, cache='', seed=None):
+        self.directory = directory
+        self.class_indices = {name: index for index, name in enumerate(class_names)}
+        self.batch_size = batch_size
+        paths, self.classes = list_directory(directory, class_names)
+        self.filepaths = paths
+        self.samples = len(paths)
+
+        num_classes = len(class_names)
+        dataset = tf.data.Dataset.from_tensor_slices((paths, self.classes))
+        dataset = dataset.map(lambda path, label: (load_image(path, image_size), label), num_parallel_calls=AUTOTUNE)
+        if cache:
+            os.makedirs(os.path.dirname(cache) or '.', exist_ok=True)
+            cache = f"{cache}-{dataset_fingerprint(directory)}-{image_size}-draft"
+        dataset = dataset.cache(cache)
+        if shuffle:
+            dataset = dataset.shuffle(self.samples, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        self.dataset = finish_batches(dataset, num_classes, augmentation)
+
+
+class PackedDataset(BatchSource):
+    """Batches of (images in [-1, 1], one-hot labels) from a split packed by pack_dataset.py
+
+    Shuffling permutes positions; each batch is then gathered from the memory-mapped
+    shards in one call, reading them in order.
+    """
+
+    def __init__(self, packed_dir, split, batch_size=32, shuffle=False, augmentation=None, seed=None):
+        self.packed = PackedSplit(packed_dir, split)
+        self.directory = self.packed.directory
+        self.class_indices = {name: index for index, name in enumerate(self.packed.class_names)}
+        self.classes = self.packed.labels
+        self.samples = self.packed.samples
+        self.batch_size = batch_size
+
+        size = self.packed.image_size
+        labels = tf.constant(self.classes)
+
+        def gather(positions):
+            images = tf.numpy_function(self.packed.images, [positions], tf.uint8)
+            images.set_shape((None, size, size, 3))
+            return images, tf.gather(labels, positions)
+
+        dataset = tf.data.Dataset.range(self.samples)
+        if shuffle:
+            dataset = dataset.shuffle(self.samples, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size).map(gather, num_parallel_calls=AUTOTUNE)
+        self.dataset = finish_batches(dataset, len(self.class_indices), augmentation)
@@ -0,0 +1,251 @@
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from classifier import IMG_SIZE, decode_image, preprocess_image
+from result_cache import image_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Longest submit() waits for a free buffer unless the caller says otherwise
+SUBMIT_TIMEOUT_S = 60.0
+
+# Set in each worker process by _init_worker
+_worker_memory = None
+_worker_buffers = None
+
+
+def _init_worker(memory_name, shape):
+    global _worker_memory, _worker_buffers
+    _worker_memory = SharedMemory(name=memory_name)
+    _worker_buffers = np.ndarray(shape, dtype=np.float32, buffer=_worker_memory.buf)
+    # One process per core: keep OpenCV from spawning its own threads as well
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _decode_into(buffer_index, row, source, draft_size, key_version):
+    """Worker task: decode one file/bytes and preprocess it into its shared-memory row"""
+    image = decode_image(io.BytesIO(source) if isinstance(source, bytes) else source, draft_size)
+    if preprocess_image(image, out=_worker_buffers[buffer_index, row:row + 1]) is None:
+        raise ValueError("Error preprocessing image")
+    # Hash the decoded pixels here so the parent never needs them (result cache key)
+    return image_cache_key(image, key_version) if key_version is not None else None
+
+
+class DecodedBatch:
+    """Images being decoded into one shared-memory batch buffer; release() when done with inputs"""
+
+    def __init__(self, pool, index, futures):
+        self.pool = pool
+        self.index = index
+        self.futures = futures
+        self.keys = [None] * len(futures)
+        self.errors = [None] * len(futures)
+        self._released = False
+
+    @property
+    def inputs(self):
+        """(N, H, W, 3) model input, a view into shared memory valid until release()"""
+        return self.pool.buffers[self.index, :len(self.futures)]
+
+    def wait(self, timeout=None):
+        """Block until every image is decoded; fills keys and errors"""
+        wait(self.futures, timeout=timeout)
+        for row, future in enumerate(self.futures):
+            if future.exception() is not None:
+                self.errors[row] = future.exception()
+            else:
+                self.keys[row] = future.result()
+        return self
+
+    def valid_inputs(self):
+        """Inputs of the rows that decoded successfully (a copy only if some failed)"""
+        ok = np.array([error is None for error in self.errors])
+        return self.inputs if ok.all() else self.inputs[ok]
+
+    def release(self):
+        """Hand the buffer back to the pool; the inputs must no longer be used"""
+        if not self._released:
+            self._released = True
+            self.pool._release(self.index)
+
+
+class InlineBatch:
+    """DecodedBatch interface for images decoded in the calling thread, used when no buffer is free"""
+
+    def __init__(self, sources, draft_size=None, key_version=None, target_size=(IMG_SIZE, IMG_SIZE)):
+        self.inputs = np.zeros((len(sources), target_size[1], target_size[0], 3), dtype=np.float32)
+        self.keys = [None] * len(sources)
+        self.errors = [None] * len(sources)
+        for row, source in enumerate(sources):
+            try:
+                image = decode_image(io.BytesIO(source) if isinstance(source, bytes) else source, draft_size)
+                if preprocess_image(image, out=self.inputs[row:row + 1]) is None:
+                    raise ValueError("Error preprocessing image")
+                if key_version is not None:
+                    self.keys[row] = image_cache_key(image, key_version)
+            except Exception as e:
+                self.errors[row] = e
+
+    def wait(self, timeout=None):
+        return self
+
+    def valid_inputs(self):
+        ok = np.array([error is None for error in self.errors])
+        return self.inputs if ok.all() else self.inputs[ok]
+
+    def release(self):
+        pass
+
+
+class DecodePool:
+    """Decode and preprocess images in worker processes, straight into shared-memory batch buffers
+
+    Workers write 224x224 float32 tensors into one of `depth` preallocated buffers of
+    `batch_size` rows, so no pixel data is pickled between processes. submit() blocks
+    while every buffer is in use, which throttles decoding when inference falls behind.
+    A caller that already holds a buffer must not block waiting for another one
+    (timeout=0), or concurrent callers can hold every buffer and wait on each other.
+
+    Workers are started from a forkserver, not forked from the (multithreaded)
+    server process, and a pool broken by a crashed worker is replaced on the next
+    submit().
+    """
+
+    def __init__(self, processes=None, batch_size=32, depth=3, draft_size=None,
+                 target_size=(IMG_SIZE, IMG_SIZE)):
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.depth = depth
+        self.draft_size = draft_size
+        self.target_size = target_size
+        self.pid = os.getpid()
+
+        shape = (depth, batch_size, target_size[1], target_size[0], 3)
+        self._memory = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float32).itemsize)
+        self.buffers = np.ndarray(shape, dtype=np.float32, buffer=self._memory.buf)
+        self._free = queue.Queue()
+        for index in range(depth):
+            self._free.put(index)
+        self._shape = shape
+        self._executor_lock = threading.Lock()
+        self._executor = self._new_executor()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._backpressure_wait = 0.0
+        self._inline_batches = 0
+        self._restarts = 0
+        logger.info(f"Decode pool started ({self.processes} processes, {depth} buffers of {batch_size})")
+
+    def submit(self, sources, key_version=None, timeout=SUBMIT_TIMEOUT_S):
+        """Queue up to batch_size files or bytes; waits up to timeout for a free buffer (backpressure)"""
+        if len(sources) > self.batch_size:
+            raise ValueError(f"At most {self.batch_size} images per batch, got {len(sources)}")
+        start = time.perf_counter()
+        try:
+            index = self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No free decode buffer") from None
+        waited = time.perf_counter() - start
+
+        try:
+            try:
+                futures = self._submit_all(index, sources, key_version)
+            except BrokenProcessPool:
+                self._restart_executor()
+                futures = self._submit_all(index, sources, key_version)
+        except BaseException:
+            self._free.put(index)
+            raise
+        with self._stats_lock:
+            self._batches += 1
+            self._images += len(sources)
+            self._backpressure_wait += waited
+        return DecodedBatch(self, index, futures)
+
+    def _new_executor(self):
+        # A forkserver preloading only this module: workers do not inherit the server's threads
+        # and locks, and the forkserver does not re-import the app's __main__
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=context, initializer=_init_worker,
+                                   initargs=(self._memory.name, self._shape))
+
+    def _submit_all(self, index, sources, key_version):
+        """Queue one task per source; on failure cancel the queued ones so the buffer is free again"""
+        executor = self._executor
+        futures = []
+        try:
+            for row, source in enumerate(sources):
+                futures.append(executor.submit(_decode_into, index, row, source, self.draft_size, key_version))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            # Tasks already running still write into the buffer
+            wait(futures)
+            raise
+        return futures
+
+    def _restart_executor(self):
+        """Replace a pool broken by a crashed (e.g. OOM-killed) worker"""
+        with self._executor_lock:
+            broken = self._executor
+            if not getattr(broken, '_broken', True):
+                # Another thread already replaced it
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+        with self._stats_lock:
+            self._restarts += 1
+        logger.warning("Decode pool worker died, restarted the process pool")
+
+    def submit_or_decode(self, sources, key_version=None, timeout=SUBMIT_TIMEOUT_S):
+        """submit(), or decode in the calling thread if no buffer frees up within timeout"""
+        try:
+            return self.submit(sources, key_version, timeout)
+        except TimeoutError:
+            with self._stats_lock:
+                self._inline_batches += 1
+            logger.warning(f"No free decode buffer after {timeout}s, decoding {len(sources)} images inline")
+            return InlineBatch(sources, self.draft_size, key_version, self.target_size)
+
+    def _release(self, index):
+        self._free.put(index)
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.buffers = None
+        try:
+            self._memory.close()
+        except BufferError:
+            # A caller still holds a view of the inputs; the mapping goes away with it
+            pass
+        self._memory.unlink()
+
+    def get_stats(self):
+        """Return pool size, buffer usage and time spent waiting for a free buffer"""
+        with self._stats_lock:
+            return {
+                'processes': self.processes,
+                'batch_size': self.batch_size,
+                'buffers': self.depth,
+                'free_buffers': self._free.qsize(),
+                'batches': self._batches,
+                'images': self._images,
+                'backpressure_wait_s': round(self._backpressure_wait, 3),
+                'inline_batches': self._inline_batches,
+                'restarts': self._restarts
+            }
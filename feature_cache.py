@@ -0,0 +1,97 @@
+"""Cached backbone features for training the classification head.
+
+Phase 1 of train_model.py keeps MobileNetV2 frozen, so its pooled output for a
+given (possibly augmented) image never changes. The features are computed once
+per dataset and configuration, stored as a memory-mapped .npy array, and the
+head is trained on them directly: an epoch becomes a pass over a small
+(N, 1280) matrix instead of N backbone forward passes.
+
+Cache files are named after a hash of the configuration (backbone, image size,
+augmentation settings, number of augmented copies) and of the dataset listing,
+so changing any of them extracts new features instead of reusing stale ones.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'feature_cache'
+
+
+def dataset_fingerprint(directory):
+    """Hash of every file's relative path, size and modification time under directory"""
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, directory)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(config):
+    """Short stable hash of a JSON-serialisable configuration"""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def labels_path(path):
+    """Labels file stored next to a features file"""
+    return path[:-len('.npy')] + '-labels.npy'
+
+
+def extract_features(extractor, generator, copies, path):
+    """Run `copies` passes of generator through extractor into a .npy memmap at path
+
+    Works with Keras directory iterators and data_pipeline.DirectoryDataset. Labels
+    are taken from the batches, so a shuffling or augmenting generator is fine.
+    The features are written under a temporary name and renamed last, so an
+    interrupted run never leaves a cache that looks complete.
+    """
+    samples = generator.samples
+    dimension = extractor.output_shape[-1]
+    temporary = path + '.tmp.npy'
+    features = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float32,
+                                         shape=(samples * copies, dimension))
+    labels = np.empty(samples * copies, dtype=np.int32)
+
+    start = time.perf_counter()
+    offset = 0
+    for copy in range(copies):
+        generator.reset()
+        # Keras iterators loop forever; take exactly one epoch of batches
+        for images, targets in itertools.islice(generator, len(generator)):
+            count = len(images)
+            features[offset:offset + count] = extractor.predict_on_batch(images)
+            labels[offset:offset + count] = np.argmax(targets, axis=1)
+            offset += count
+        logger.info(f"Extracted features for copy {copy + 1}/{copies} of {generator.directory} "
+                    f"({time.perf_counter() - start:.1f}s)")
+
+    features.flush()
+    del features
+    np.save(labels_path(path), labels)
+    os.replace(temporary, path)
+
+
+def cached_features(extractor, generator, split, config, copies=1, cache_dir=DEFAULT_CACHE_DIR):
+    """Return (features memmap, labels) for a split, extracting them on the first call
+
+    `config` describes everything besides the dataset that changes the features
+    (backbone, weights, image size, augmentation); it becomes part of the file name.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = cache_key(dict(config, split=split, copies=copies, dataset=dataset_fingerprint(generator.directory)))
+    path = os.path.join(cache_dir, f'{split}-{key}.npy')
+    if os.path.exists(path) and os.path.exists(labels_path(path)):
+        logger.info(f"Using cached {split} features {path}")
+    else:
+        logger.info(f"Extracting {split} features into {path}")
+        extract_features(extractor, generator, copies, path)
+    return np.load(path, mmap_mode='r'), np.load(labels_path(path))
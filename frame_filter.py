@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+
+class FrameChangeDetector:
+    """Skip classifying camera frames that look the same as the last classified one"""
+
+    def __init__(self, threshold=4.0, size=32, max_reuse_seconds=10.0):
+        # threshold: mean absolute difference (0-255) between grayscale thumbnails
+        self.threshold = threshold
+        self.size = size
+        # Reclassify at least this often even if the scene looks static (0 = never)
+        self.max_reuse_seconds = max_reuse_seconds
+
+        self._lock = threading.Lock()
+        self._reference = None
+        self._reference_time = 0.0
+        self._last_difference = None
+        self.classified = 0
+        self.skipped = 0
+
+    def thumbnail(self, frame):
+        """Downscale to a small grayscale image; cheap enough to run on every frame"""
+        import cv2
+        small = cv2.resize(frame, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def has_changed(self, frame):
+        """Return True if the frame should be classified, and make it the new reference"""
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+        with self._lock:
+            if self._reference is not None and self._reference.shape == thumb.shape:
+                self._last_difference = float(np.mean(np.abs(thumb - self._reference)))
+                stale = self.max_reuse_seconds and now - self._reference_time >= self.max_reuse_seconds
+                if self._last_difference < self.threshold and not stale:
+                    self.skipped += 1
+                    return False
+            self._reference = thumb
+            self._reference_time = now
+            self.classified += 1
+            return True
+
+    def reset(self):
+        """Forget the reference frame, e.g. when the camera is restarted"""
+        with self._lock:
+            self._reference = None
+            self._last_difference = None
+
+    def get_stats(self):
+        """Return counters of classified vs. skipped frames"""
+        with self._lock:
+            total = self.classified + self.skipped
+            return {
+                'threshold': self.threshold,
+                'classified_frames': self.classified,
+                'skipped_frames': self.skipped,
+                'skip_rate': round(self.skipped / total, 4) if total else 0.0,
+                'last_difference': round(self._last_difference, 3) if self._last_difference is not None else None
+            }
@@ -0,0 +1,88 @@
+"""Gunicorn settings for app.py.
+
+    gunicorn -c gunicorn.conf.py app:app
+    SHARED_INFERENCE=1 WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py app:app
+
+Every worker loads its own engine (MODEL_LOADING=background): TensorFlow, ONNX
+Runtime sessions and the TFLite XNNPACK thread pool are not fork-safe, so none of
+them may be created in the master. MODEL_LOADING=preload only imports the app in
+the master (shared modules); each worker still builds its engine in post_fork.
+The cores are divided between the workers (INFERENCE_THREADS per worker).
+
+Camera streams are per process, so the camera routes are only enabled with
+WEB_CONCURRENCY=1; every open /video_feed or /prediction_stream then holds one of
+the GUNICORN_THREADS threads (app_async.py serves many viewers without threads).
+
+With SHARED_INFERENCE=1 the master starts inference_server.py and the workers
+send their batches to it over a Unix socket (INFERENCE_SERVER): HTTP workers
+scale without extra model copies, and requests from all of them are batched
+together. This works with every engine, including Keras. The socket goes into a
+new private (0700) directory and on_starting generates a random connection key
+that the server and the workers inherit through INFERENCE_SERVER_AUTHKEY.
+"""
+import gc
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SHARED_INFERENCE = os.environ.get('SHARED_INFERENCE', '0') == '1'
+socket_dir = None
+if SHARED_INFERENCE:
+    # Not a predictable path in /tmp: other local users must not be able to reach the socket
+    if 'INFERENCE_SERVER' not in os.environ:
+        socket_dir = tempfile.mkdtemp(prefix='trashclassify-')
+        os.environ['INFERENCE_SERVER'] = os.path.join(socket_dir, 'inference.sock')
+    # Workers only hold a socket connection, opened after fork
+    os.environ.setdefault('MODEL_LOADING', 'background')
+
+# Must be set before gunicorn imports app.py in the master
+os.environ.setdefault('MODEL_LOADING', 'background')
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ['MODEL_LOADING'] == 'preload'
+if preload_app:
+    # app.py then leaves building the engine to post_fork
+    os.environ['MODEL_LOAD_AFTER_FORK'] = '1'
+if workers > 1:
+    # Requests of one viewer would land on different workers, each with its own camera
+    os.environ.setdefault('CAMERA_ENABLED', '0')
+if not SHARED_INFERENCE:
+    # Each worker runs its own engine: one engine per core set, not workers x all cores
+    os.environ.setdefault('INFERENCE_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+# First predictions can be slow while the engine warms up
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+inference_process = None
+
+def on_starting(server):
+    global inference_process
+    if SHARED_INFERENCE:
+        # Fresh key per start, inherited by the inference server and the forked workers
+        os.environ['INFERENCE_SERVER_AUTHKEY'] = secrets.token_bytes(32).hex()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_server.py')
+        inference_process = subprocess.Popen([sys.executable, script, '--address', os.environ['INFERENCE_SERVER']])
+        server.log.info(f"Started inference server (pid {inference_process.pid}) on {os.environ['INFERENCE_SERVER']}")
+
+def on_exit(server):
+    if inference_process is not None:
+        inference_process.terminate()
+        inference_process.wait(timeout=10)
+    if socket_dir is not None:
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+def post_fork(server, worker):
+    if preload_app:
+        # Already imported by the master; build and warm up this worker's engine before serving
+        import app
+        app.load_model_now()
+
+def when_ready(server):
+    # Move everything allocated while preloading into the permanent generation so the
+    # garbage collector in each worker doesn't touch (and un-share) those pages
+    if preload_app:
+        gc.freeze()
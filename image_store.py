@@ -0,0 +1,251 @@
+import hashlib
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = ('original', 'jpg', 'png', 'webp')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class ImageStore:
+    """Save uploads and camera captures off the request path, with content-addressed names
+
+    Saving only hashes the data and queues it: a single writer thread encodes and
+    writes files, and evicts the oldest ones past max_bytes or older than
+    max_age_seconds every EVICT_INTERVAL writes and at least every
+    evict_interval_s seconds, even while no images arrive. Identical content maps
+    to the same file, so it is written once. When the bounded queue stays full for
+    put_timeout, the image is dropped (save returns None) instead of stalling the
+    request. The returned name may not exist on disk yet; wait_saved() blocks until
+    it does.
+
+    image_format 'original' keeps uploads byte-for-byte and stores captures as JPEG;
+    'jpg', 'png' or 'webp' re-encodes everything with the given quality.
+    """
+
+    # Scanning the directory is O(files), so only do it every N writes
+    EVICT_INTERVAL = 32
+
+    def __init__(self, directory, image_format='original', quality=90, max_queue=64, put_timeout=0.5,
+                 max_bytes=512 * 1024 * 1024, max_age_seconds=7 * 24 * 3600, evict_interval_s=300.0):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format {image_format!r}, expected one of {IMAGE_FORMATS}")
+        self.directory = directory
+        self.image_format = image_format
+        self.quality = quality
+        self.put_timeout = put_timeout
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_interval_s = evict_interval_s
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._lock = threading.Lock()
+        # Notified whenever the writer finishes an image
+        self._saved = threading.Condition(self._lock)
+        self._thread = None
+        self._thread_pid = None
+        self._writes = 0
+        self._total_write = 0.0
+        self._disk_bytes = None
+        self._disk_files = None
+        self._stats = {'written': 0, 'deduplicated': 0, 'dropped': 0, 'evicted': 0, 'errors': 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save_file(self, data, extension):
+        """Queue an uploaded file (encoded bytes); returns its filename or None if dropped"""
+        extension = extension.lower().lstrip('.')
+        if self.image_format != 'original':
+            extension = self.image_format
+        name = f"{hashlib.blake2b(data, digest_size=16).hexdigest()}.{extension}"
+        return self._enqueue(name, 'file', data)
+
+    def save_frame(self, frame):
+        """Queue a BGR camera frame (numpy array); returns its filename or None if dropped"""
+        extension = 'jpg' if self.image_format == 'original' else self.image_format
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{frame.shape}|{frame.dtype}|".encode())
+        digest.update(memoryview(frame).cast('B') if frame.flags.c_contiguous else frame.tobytes())
+        return self._enqueue(f"{digest.hexdigest()}.{extension}", 'frame', frame)
+
+    def wait_saved(self, name, timeout=None):
+        """Wait until a queued image has been written; False if it failed or timed out"""
+        with self._saved:
+            if not self._saved.wait_for(lambda: name not in self._pending, timeout):
+                return False
+        return os.path.exists(os.path.join(self.directory, name))
+
+    def flush(self, timeout=None):
+        """Wait until every queued image has been written; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def get_stats(self):
+        """Return queue depth, write/drop/eviction counters and disk usage"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['avg_write_ms'] = round(self._total_write / self._writes * 1000, 2) if self._writes else 0.0
+            stats['disk_files'] = self._disk_files
+            stats['disk_mb'] = round(self._disk_bytes / 1024 / 1024, 2) if self._disk_bytes is not None else None
+        stats['queue_depth'] = self._queue.qsize()
+        stats['max_queue'] = self._queue.maxsize
+        stats['format'] = self.image_format
+        return stats
+
+    def _enqueue(self, name, kind, payload):
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._ensure_started()
+            if name in self._pending or os.path.exists(path):
+                self._stats['deduplicated'] += 1
+                duplicate = True
+            else:
+                self._pending.add(name)
+                duplicate = False
+        if duplicate:
+            # Refresh the age so retention keeps recently seen content
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return name
+
+        try:
+            self._queue.put((name, kind, payload), timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning(f"Image store queue full, not saving {name}")
+            with self._lock:
+                self._pending.discard(name)
+                self._stats['dropped'] += 1
+            return None
+        return name
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so restart the writer in each child process
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+            return
+        self._thread_pid = pid
+        self._thread = threading.Thread(target=self._run, name="image-store", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self._evict()
+        next_evict = time.monotonic() + self.evict_interval_s if self.evict_interval_s else None
+        while True:
+            # Wake up for the timed eviction when no image arrives before it is due
+            timeout = max(0.0, next_evict - time.monotonic()) if next_evict is not None else None
+            try:
+                name, kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                evict = True
+            else:
+                written = False
+                try:
+                    written = self._write(name, kind, payload)
+                finally:
+                    with self._lock:
+                        self._pending.discard(name)
+                        self._saved.notify_all()
+                        evict = written and self._stats['written'] % self.EVICT_INTERVAL == 0
+                    self._queue.task_done()
+            if evict or (next_evict is not None and time.monotonic() >= next_evict):
+                self._evict()
+                if next_evict is not None:
+                    next_evict = time.monotonic() + self.evict_interval_s
+
+    def _encode(self, kind, payload, extension):
+        if kind == 'frame':
+            import cv2
+            params = []
+            if extension == 'jpg':
+                params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+            elif extension == 'webp':
+                params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+            ret, buffer = cv2.imencode(f'.{extension}', payload, params)
+            if not ret:
+                raise ValueError(f"Could not encode frame as {extension}")
+            return buffer.tobytes()
+
+        if self.image_format == 'original':
+            return payload
+
+        from PIL import Image
+        img = Image.open(io.BytesIO(payload))
+        if img.mode not in ('RGB', 'RGBA') or extension == 'jpg':
+            img = img.convert('RGB')
+        output = io.BytesIO()
+        img.save(output, format='JPEG' if extension == 'jpg' else extension.upper(), quality=self.quality)
+        return output.getvalue()
+
+    def _write(self, name, kind, payload):
+        path = os.path.join(self.directory, name)
+        temp_path = f'{path}.tmp'
+        start = time.perf_counter()
+        try:
+            data = self._encode(kind, payload, name.rsplit('.', 1)[1])
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving {path}: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return False
+        with self._lock:
+            self._stats['written'] += 1
+            self._writes += 1
+            self._total_write += time.perf_counter() - start
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+                self._disk_files += 1
+        return True
+
+    def _evict(self):
+        """Remove images older than max_age_seconds, then the oldest until the directory fits max_bytes"""
+        entries = []
+        now = time.time()
+        evicted = 0
+        for name in os.listdir(self.directory):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if self.max_age_seconds and now - stat.st_mtime >= self.max_age_seconds:
+                evicted += self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        files = len(entries)
+        for _, size, path in sorted(entries):
+            if not self.max_bytes or total <= self.max_bytes:
+                break
+            evicted += self._remove(path)
+            total -= size
+            files -= 1
+
+        with self._lock:
+            self._stats['evicted'] += evicted
+            self._disk_bytes = total
+            self._disk_files = files
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return 1
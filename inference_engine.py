@@ -0,0 +1,231 @@
+"""Pluggable inference backends for the trash classifier.
+
+The apps pick an engine with the INFERENCE_ENGINE environment variable:
+
+    keras        full Keras .h5 model (default)
+    tflite-fp16  float16 TFLite export
+    tflite-int8  int8 post-training-quantized TFLite export
+    onnx         ONNX Runtime
+
+Every engine takes the same preprocessed (N, 224, 224, 3) float32 batch and
+returns (N, num_classes) softmax probabilities, so callers do not care which
+one is active. Exports are produced by model_export.py.
+"""
+import os
+import hashlib
+import logging
+import threading
+import time
+
+import numpy as np
+
+from classifier import MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.dirname(MODEL_PATH)
+MODEL_BASENAME = os.path.splitext(os.path.basename(MODEL_PATH))[0]
+
+# Default artifact for each engine, written next to the Keras model
+ENGINE_PATHS = {
+    'keras': MODEL_PATH,
+    'tflite-fp16': os.path.join(MODEL_DIR, f'{MODEL_BASENAME}_fp16.tflite'),
+    'tflite-int8': os.path.join(MODEL_DIR, f'{MODEL_BASENAME}_int8.tflite'),
+    'onnx': os.path.join(MODEL_DIR, f'{MODEL_BASENAME}.onnx'),
+}
+
+DEFAULT_ENGINE = os.environ.get('INFERENCE_ENGINE', 'keras')
+# Intra-op threads of the TFLite/ONNX engines (default: all cores); gunicorn.conf.py divides
+# the cores between its workers
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
+
+# The Keras engine runs the model through one tf.function with a fixed input signature. KERAS_XLA=1
+# compiles it with XLA; batches are then padded to a KERAS_BATCH_BUCKETS size, so only those shapes
+# are ever compiled and warm_up() can compile all of them before the first request
+KERAS_XLA = os.environ.get('KERAS_XLA', '0') == '1'
+KERAS_BATCH_BUCKETS = tuple(int(size) for size in os.environ.get('KERAS_BATCH_BUCKETS', '1,2,4,8,16').split(','))
+
+
+class InferenceEngine:
+    """Common interface: predict() maps a preprocessed batch to class probabilities"""
+
+    name = 'base'
+
+    def __init__(self, path):
+        self.path = path
+        self.version = model_fingerprint(path)
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path!r})"
+
+
+class KerasEngine(InferenceEngine):
+    """Full Keras model loaded from .h5
+
+    Calls the model through a traced tf.function instead of model.predict(), which
+    sets up a data adapter and step function on every call; for single images that
+    overhead is several times the cost of the network itself.
+    """
+
+    name = 'keras'
+
+    def __init__(self, path=ENGINE_PATHS['keras'], jit_compile=KERAS_XLA, batch_buckets=KERAS_BATCH_BUCKETS):
+        super().__init__(path)
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+        self.model = load_model(path)
+        # Batch sizes that are compiled ahead of time (None: any size runs without padding)
+        self.batch_buckets = sorted(batch_buckets) if jit_compile else None
+        input_spec = tf.TensorSpec((None,) + tuple(self.model.input_shape[1:]), tf.float32)
+        self._forward = tf.function(lambda batch: self.model(batch, training=False),
+                                    input_signature=[input_spec], jit_compile=jit_compile)
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if not self.batch_buckets:
+            return self._forward(batch).numpy()
+        largest = self.batch_buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            count = len(chunk)
+            size = next(bucket for bucket in self.batch_buckets if bucket >= count)
+            if size > count:
+                chunk = np.concatenate([chunk, np.zeros((size - count,) + chunk.shape[1:], dtype=np.float32)])
+            outputs.append(self._forward(chunk).numpy()[:count])
+        return np.concatenate(outputs)
+
+
+class TFLiteEngine(InferenceEngine):
+    """TFLite interpreter; handles float and quantized input/output tensors"""
+
+    name = 'tflite'
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path)
+        Interpreter = _import_tflite_interpreter()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = list(self._input['shape'])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self._input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+            dtype = self._input['dtype']
+            if dtype != np.float32:
+                scale, zero_point = self._input['quantization']
+                batch = np.clip(np.round(batch / scale + zero_point),
+                                np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            if self._output['dtype'] != np.float32:
+                scale, zero_point = self._output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output.copy()
+
+
+class OnnxEngine(InferenceEngine):
+    """ONNX Runtime session on CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, path=ENGINE_PATHS['onnx'], num_threads=None):
+        super().__init__(path)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def model_fingerprint(path):
+    """Short content hash of a model file, used as its version in caches and responses"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _import_tflite_interpreter():
+    """Prefer the standalone LiteRT/tflite-runtime packages, fall back to TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+def create_engine(engine=None, path=None, num_threads=None):
+    """Instantiate an engine by name, using its default artifact path unless one is given"""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINE_PATHS:
+        raise ValueError(f"Unknown inference engine '{engine}' (choose from {', '.join(ENGINE_PATHS)})")
+    path = path or ENGINE_PATHS[engine]
+    num_threads = num_threads or INFERENCE_THREADS
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file {path} not found for engine '{engine}'")
+
+    if engine == 'keras':
+        instance = KerasEngine(path)
+    elif engine.startswith('tflite'):
+        instance = TFLiteEngine(path, num_threads=num_threads)
+        instance.name = engine
+    else:
+        instance = OnnxEngine(path, num_threads=num_threads)
+    return instance
+
+
+def load_engine(engine=None, path=None, num_threads=None):
+    """Like create_engine() but logs and returns None on failure so the apps can fall back to demo mode"""
+    try:
+        instance = create_engine(engine, path, num_threads)
+        logger.info(f"Model loaded successfully ({instance.name} engine: {instance.path})")
+        return instance
+    except FileNotFoundError as e:
+        logger.warning(str(e))
+    except Exception as e:
+        logger.error(f"Error loading model: {e}")
+    return None
+
+
+def warm_up(engine, batch_sizes=(1,), image_size=224):
+    """Run one zero batch of each size through an engine before it serves requests; returns seconds per size"""
+    seconds = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        engine.predict(np.zeros((batch_size, image_size, image_size, 3), dtype=np.float32))
+        seconds[batch_size] = round(time.perf_counter() - start, 4)
+    return seconds
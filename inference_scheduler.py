@@ -0,0 +1,245 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceFuture(Future):
+    """Future of one request's predictions; engine is the engine that computed them (with engine_fn)"""
+
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+
+
+class InferenceScheduler:
+    """Group concurrent inference requests into micro-batches for a single predict call
+
+    Batches run through predict_fn(batch), or through the engine that engine_fn()
+    returns at the time the batch runs. With engine_fn each future records that
+    engine, so results can be labelled by the model that produced them even if
+    the engine is replaced while the request is in flight.
+    """
+
+    def __init__(self, predict_fn=None, max_batch_size=8, max_wait_ms=5.0, engine_fn=None):
+        if (predict_fn is None) == (engine_fn is None):
+            raise ValueError("Pass exactly one of predict_fn and engine_fn")
+        self.predict_fn = predict_fn
+        self.engine_fn = engine_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._thread_pid = None
+        self._running = False
+        # Reused input batch; only the worker thread touches it
+        self._batch_buffer = None
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._total_inference = 0.0
+        self._batch_size_histogram = {}
+        # Smoothed seconds per batch, by batch size (for estimate_latency); the first
+        # batch of each size is left out since engines often compile per input shape
+        self._batch_seconds = {}
+
+    def start(self):
+        """Start the batching worker thread if it is not running in this process"""
+        with self._condition:
+            self._ensure_started()
+
+    def stop(self):
+        """Stop the worker thread and fail any requests still waiting"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+            pending = list(self._pending)
+            self._pending.clear()
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, image_batch):
+        """Queue a preprocessed (N, H, W, C) tensor and return a Future of its predictions"""
+        future = InferenceFuture()
+        with self._condition:
+            self._ensure_started()
+            self._pending.append((image_batch, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    def predict(self, image_batch, timeout=None):
+        """Blocking helper with the same contract as model.predict for a small batch"""
+        return self.submit(image_batch).result(timeout=timeout)
+
+    def predict_with_engine(self, image_batch, timeout=None):
+        """Blocking helper returning (predictions, engine that computed them)"""
+        future = self.submit(image_batch)
+        return future.result(timeout=timeout), future.engine
+
+    def estimate_latency(self, images):
+        """Seconds until a new request of `images` inputs would have its predictions
+
+        Counts the inputs already queued ahead of it, split into full batches, at the
+        measured time per batch size; 0.0 before any batch has run.
+        """
+        with self._condition:
+            queued = sum(len(item[0]) for item in self._pending)
+        with self._stats_lock:
+            batch_seconds = dict(self._batch_seconds)
+        if not batch_seconds:
+            return 0.0
+
+        def batch_cost(size):
+            # Interpolate between measured sizes; scale linearly above the largest
+            smaller = [known for known in batch_seconds if known <= size]
+            larger = [known for known in batch_seconds if known >= size]
+            if not smaller:
+                return batch_seconds[min(larger)]
+            low = max(smaller)
+            if not larger:
+                return batch_seconds[low] * size / low
+            high = min(larger)
+            if low == high:
+                return batch_seconds[low]
+            return batch_seconds[low] + (batch_seconds[high] - batch_seconds[low]) * (size - low) / (high - low)
+
+        full_batches, rest = divmod(queued + images, self.max_batch_size)
+        estimate = full_batches * batch_cost(self.max_batch_size) + (batch_cost(rest) if rest else 0.0)
+        return self.max_wait + estimate
+
+    def get_stats(self):
+        """Return queue depth, batch size and wait time metrics"""
+        with self._condition:
+            queue_depth = len(self._pending)
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                'queue_depth': queue_depth,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'batches': batches,
+                'images': self._images,
+                'last_batch_size': self._last_batch_size,
+                'max_batch_size_seen': self._max_batch_seen,
+                'avg_batch_size': round(self._images / batches, 2) if batches else 0.0,
+                'avg_wait_ms': round(self._total_wait / self._images * 1000, 2) if self._images else 0.0,
+                'max_wait_ms_seen': round(self._max_wait_seen * 1000, 2),
+                'avg_inference_ms': round(self._total_inference / batches * 1000, 2) if batches else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_size_histogram.items()))
+            }
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so restart the worker in each child process
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+            return
+        self._running = True
+        self._thread_pid = pid
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f})")
+
+    def _next_batch(self):
+        """Wait for work, then collect until the batch is full or the oldest request times out"""
+        with self._condition:
+            while self._running and not self._pending:
+                self._condition.wait()
+            if not self._running:
+                return []
+
+            deadline = self._pending[0][2] + self.max_wait
+            while self._running and sum(len(item[0]) for item in self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            if not self._pending:
+                # stop() failed the pending requests while this thread waited
+                return []
+            # Never exceed max_batch_size, except for a single request that is larger on its own
+            batch = [self._pending.popleft()]
+            images = len(batch[0][0])
+            while self._pending and images + len(self._pending[0][0]) <= self.max_batch_size:
+                images += len(self._pending[0][0])
+                batch.append(self._pending.popleft())
+            return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            engine = None
+            try:
+                inputs = self._assemble(batch)
+                if self.engine_fn is not None:
+                    engine = self.engine_fn()
+                    predictions = np.asarray(engine.predict(inputs))
+                else:
+                    predictions = np.asarray(self.predict_fn(inputs))
+            except Exception as e:
+                logger.error(f"Error running batched inference: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            # Hand each caller back its own slice of the batch output
+            offset = 0
+            for image_batch, future, _ in batch:
+                count = len(image_batch)
+                future.engine = engine
+                future.set_result(predictions[offset:offset + count])
+                offset += count
+
+            self._record(batch, len(inputs), started, finished)
+
+    def _assemble(self, batch):
+        """Copy the queued inputs into the reusable batch buffer (a single request is passed through)"""
+        if len(batch) == 1:
+            return batch[0][0]
+        first = batch[0][0]
+        count = sum(len(item[0]) for item in batch)
+        buffer = self._batch_buffer
+        if (buffer is None or buffer.shape[1:] != first.shape[1:] or buffer.dtype != first.dtype
+                or len(buffer) < count):
+            buffer = np.empty((max(count, self.max_batch_size),) + first.shape[1:], dtype=first.dtype)
+            self._batch_buffer = buffer
+        return np.concatenate([item[0] for item in batch], axis=0, out=buffer[:count])
+
+    def _record(self, batch, batch_size, started, finished):
+        waits = [(started - enqueued, len(image_batch)) for image_batch, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._images += batch_size
+            self._last_batch_size = batch_size
+            self._max_batch_seen = max(self._max_batch_seen, batch_size)
+            self._total_wait += sum(wait * count for wait, count in waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(wait for wait, _ in waits))
+            self._total_inference += finished - started
+            self._batch_size_histogram[batch_size] = self._batch_size_histogram.get(batch_size, 0) + 1
+            seconds = finished - started
+            previous = self._batch_seconds.get(batch_size)
+            if self._batch_size_histogram[batch_size] == 2:
+                self._batch_seconds[batch_size] = seconds
+            elif previous is not None:
+                self._batch_seconds[batch_size] = 0.8 * previous + 0.2 * seconds
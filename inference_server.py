@@ -0,0 +1,194 @@
+"""Shared inference process for multi-worker deployments.
+
+    export INFERENCE_SERVER_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')
+    python inference_server.py --address /run/trashclassify/inference.sock --engine tflite-int8
+    INFERENCE_SERVER=/run/trashclassify/inference.sock gunicorn -c gunicorn.conf.py app:app
+
+One process loads the model and serves predictions over a local socket; every
+HTTP worker talks to it through RemoteEngine, which has the same predict()
+interface as the local engines. Requests from all workers go through one
+InferenceScheduler, so they are batched together and the model is in memory
+once no matter how many workers run. gunicorn.conf.py starts this server itself
+when SHARED_INFERENCE=1, with a fresh key and a socket in a new private directory.
+
+Connections unpickle what they receive, so only processes that know the key may
+connect: there is no default key, and the socket must live in a directory that
+only this user can enter (mode 0700).
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from inference_engine import DEFAULT_ENGINE, create_engine, warm_up
+from inference_scheduler import InferenceScheduler
+
+logger = logging.getLogger(__name__)
+
+# Hex-encoded key shared by the server and its clients
+AUTHKEY_ENV = 'INFERENCE_SERVER_AUTHKEY'
+
+
+def auth_key():
+    """Connection key from INFERENCE_SERVER_AUTHKEY; there is deliberately no default"""
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise RuntimeError(f"{AUTHKEY_ENV} is not set; create one with "
+                           f"python -c 'import secrets; print(secrets.token_hex(32))'")
+    return bytes.fromhex(key)
+
+
+def private_socket_path():
+    """Socket path in a new directory only this user can enter (mkdtemp creates it 0700)"""
+    return os.path.join(tempfile.mkdtemp(prefix='trashclassify-'), 'inference.sock')
+
+
+def check_private_directory(address):
+    """Create the socket's directory 0700, or refuse one that other users can enter"""
+    directory = os.path.dirname(os.path.abspath(address))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    status = os.stat(directory)
+    if status.st_mode & 0o077 or status.st_uid != os.getuid():
+        raise RuntimeError(f"Socket directory {directory} must be owned by this user with mode 0700")
+
+
+def handle_connection(connection, engine, scheduler):
+    """Answer requests from one worker until it disconnects"""
+    with connection:
+        while True:
+            try:
+                command, payload = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if command == 'predict':
+                    reply = scheduler.predict(payload)
+                elif command == 'info':
+                    reply = {'engine': engine.name, 'path': engine.path, 'version': engine.version}
+                elif command == 'stats':
+                    reply = scheduler.get_stats()
+                else:
+                    raise ValueError(f"Unknown command {command!r}")
+                connection.send(('ok', reply))
+            except Exception as e:
+                logger.error(f"Error handling {command} request: {e}")
+                connection.send(('error', str(e)))
+
+
+def serve(address, engine=None, model_path=None, max_batch_size=16, max_wait_ms=5.0,
+          num_threads=None):
+    """Load the model once and serve predict requests on a Unix socket until interrupted"""
+    key = auth_key()
+    check_private_directory(address)
+    instance = create_engine(engine, model_path, num_threads)
+    # Trace/allocate for every batch size the scheduler can form before accepting clients
+    seconds = warm_up(instance, getattr(instance, 'batch_buckets', None) or range(1, max_batch_size + 1))
+    logger.info(f"Warmed up in {sum(seconds.values()):.2f}s")
+    scheduler = InferenceScheduler(instance.predict, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    scheduler.start()
+
+    if os.path.exists(address):
+        os.remove(address)
+    with Listener(address, family='AF_UNIX', authkey=key) as listener:
+        logger.info(f"Inference server ready on {address} ({instance.name} engine: {instance.path})")
+        while True:
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError) as e:
+                # A client that fails the handshake must not take the server down
+                logger.warning(f"Rejected inference client: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(connection, instance, scheduler),
+                             name='inference-connection', daemon=True).start()
+
+
+class RemoteEngine:
+    """Client for the shared inference server, usable wherever a local engine is"""
+
+    name = 'remote'
+
+    def __init__(self, address):
+        self.address = address
+        # One connection per thread: a connection carries one request at a time
+        self._local = threading.local()
+        info = self._call('info')
+        self.engine = info['engine']
+        self.path = info['path']
+        self.version = info['version']
+
+    def predict(self, batch):
+        return self._call('predict', batch)
+
+    def get_stats(self):
+        """Batching statistics of the server, i.e. across all workers"""
+        return self._call('stats')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        pid = getattr(self._local, 'pid', None)
+        # Connections must not be shared with a forked child
+        if connection is None or pid != os.getpid():
+            connection = Client(self.address, family='AF_UNIX', authkey=auth_key())
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _call(self, command, payload=None):
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.send((command, payload))
+                status, reply = connection.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted: reconnect once
+                self._local.connection = None
+                if attempt:
+                    raise
+        if status != 'ok':
+            raise RuntimeError(f"Inference server error: {reply}")
+        return reply
+
+    def __repr__(self):
+        return f"RemoteEngine({self.address!r}, engine={self.engine!r})"
+
+
+def connect_inference_server(address, timeout=120.0):
+    """Connect to the server, waiting for it to finish loading; logs and returns None on failure"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            instance = RemoteEngine(address)
+            logger.info(f"Connected to inference server {address} ({instance.engine} engine)")
+            return instance
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            if time.monotonic() >= deadline:
+                logger.error(f"Inference server {address} not available: {e}")
+                return None
+            time.sleep(0.5)
+        except Exception as e:
+            logger.error(f"Error connecting to inference server {address}: {e}")
+            return None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve the trash classifier to local HTTP workers")
+    parser.add_argument('--address', default=os.environ.get('INFERENCE_SERVER') or None,
+                        help="Unix socket path (default: a new private directory under the temp dir)")
+    parser.add_argument('--engine', default=DEFAULT_ENGINE)
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--max-batch-size', type=int, default=int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16)))
+    parser.add_argument('--max-wait-ms', type=float, default=float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5)))
+    parser.add_argument('--threads', type=int, default=None, help="Intra-op threads for TFLite/ONNX")
+    args = parser.parse_args()
+
+    serve(args.address or private_socket_path(), args.engine, args.model_path, args.max_batch_size,
+          args.max_wait_ms, args.threads)
+
+if __name__ == '__main__':
+    main()
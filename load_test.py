@@ -0,0 +1,181 @@
+"""Load-test /upload under gunicorn for different worker counts.
+
+    python load_test.py --workers 1 2 4 --modes shared per-worker --requests 300 --concurrency 16
+
+For every (mode, worker count) a fresh gunicorn is started with gunicorn.conf.py:
+  - shared:      SHARED_INFERENCE=1, one inference_server.py process holds the model
+  - per-worker:  every worker loads its own model (MODEL_LOADING=background)
+The result cache is disabled and images are distinct, so every request runs inference.
+We record requests/sec, p50/p99 latency, errors and the total RSS of all processes.
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MODES = ('shared', 'per-worker')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def make_images(count, width=320, height=240):
+    """Distinct JPEGs so neither the result cache nor the image store deduplicates them"""
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        output = io.BytesIO()
+        Image.fromarray(pixels).save(output, format='JPEG', quality=85)
+        images.append(output.getvalue())
+    return images
+
+def multipart_body(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def post_image(url, data):
+    """Return (latency_seconds, ok)"""
+    body, content_type = multipart_body('file', 'load.jpg', data)
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            ok = response.status == 200 and 'error' not in json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def http_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+def process_tree(pid):
+    """pid plus all of its descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def wait_until_ready(base, workers, process, timeout):
+    """Poll /ready until enough consecutive answers say every worker has its model"""
+    start = time.perf_counter()
+    streak = 0
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        streak = streak + 1 if http_status(base + '/ready') == 200 else 0
+        if streak >= 4 * workers:
+            return
+        time.sleep(0.1)
+    raise TimeoutError("Server did not become ready")
+
+def run(mode, workers, images, requests, concurrency, threads, timeout=600):
+    port = free_port()
+    env = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), RESULT_CACHE_SIZE='0')
+    if mode == 'shared':
+        env.update(SHARED_INFERENCE='1',
+                   INFERENCE_SERVER=os.path.join(tempfile.mkdtemp(), 'inference.sock'))
+    else:
+        env.update(SHARED_INFERENCE='0', MODEL_LOADING='background')
+        env.pop('INFERENCE_SERVER', None)
+    base = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(base, workers, process, timeout)
+        url = base + '/upload'
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Warm up every worker (first predictions are slow)
+            list(executor.map(lambda i: post_image(url, images[i % len(images)]), range(concurrency * 2)))
+            start = time.perf_counter()
+            results = list(executor.map(lambda i: post_image(url, images[i % len(images)]), range(requests)))
+            elapsed = time.perf_counter() - start
+        memory = sum(rss_mb(pid) for pid in process_tree(process.pid))
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = np.array([latency for latency, ok in results if ok]) * 1000
+    return {
+        'mode': mode,
+        'workers': workers,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in results if not ok),
+        'requests_per_sec': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+        'total_rss_mb': round(memory, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app under gunicorn by worker count")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker")
+    parser.add_argument('--images', type=int, default=64, help="Number of distinct test images")
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    images = make_images(args.images)
+    results = []
+    for mode in args.modes:
+        for workers in args.workers:
+            result = run(mode, workers, images, args.requests, args.concurrency, args.threads)
+            results.append(result)
+            print(f"{mode:<10} {workers:>2} workers | {result['requests_per_sec']:>7.1f} req/s | "
+                  f"p50 {result['p50_ms']:>7.1f} ms | p99 {result['p99_ms']:>7.1f} ms | "
+                  f"errors {result['errors']:>3} | RSS {result['total_rss_mb']:>7.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Export the trained Keras model to TFLite (float16 / int8) and ONNX.
+
+Called at the end of train_model.py, or on its own to convert an existing model:
+
+    python model_export.py --model model/trash_classification_model.h5 --val-dir rubbish-data/val
+
+The int8 model uses post-training quantization calibrated on images from the
+validation split. Float input/output tensors are kept so every engine in
+inference_engine.py accepts the same preprocessed batch.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from classifier import MODEL_PATH, load_image_file, preprocess_image
+from inference_engine import ENGINE_PATHS
+
+EXPORT_FORMATS = ('tflite-fp16', 'tflite-int8', 'onnx')
+CALIBRATION_SAMPLES = 200
+
+def calibration_images(val_dir, num_samples=CALIBRATION_SAMPLES, seed=42):
+    """Pick a class-balanced random sample of validation image paths"""
+    rng = random.Random(seed)
+    classes = sorted(d for d in os.listdir(val_dir) if os.path.isdir(os.path.join(val_dir, d)))
+    per_class = max(1, num_samples // max(1, len(classes)))
+    paths = []
+    for class_name in classes:
+        class_dir = os.path.join(val_dir, class_name)
+        files = sorted(os.listdir(class_dir))
+        rng.shuffle(files)
+        paths += [os.path.join(class_dir, f) for f in files[:per_class]]
+    return paths
+
+def representative_dataset(val_dir, num_samples=CALIBRATION_SAMPLES):
+    """Calibration generator for the TFLite converter, preprocessed like the apps do"""
+    paths = calibration_images(val_dir, num_samples)
+
+    def generator():
+        for path in paths:
+            image = preprocess_image(load_image_file(path))
+            if image is not None:
+                yield [image.astype(np.float32)]
+
+    return generator
+
+def _tflite_converter(model, saved_model_dir):
+    """Build a converter; Keras 3 models convert most reliably through a SavedModel"""
+    if hasattr(model, 'export'):
+        model.export(saved_model_dir)
+        return tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    return tf.lite.TFLiteConverter.from_keras_model(model)
+
+def export_tflite(model, output_path, quantization='fp16', val_dir=None,
+                  num_samples=CALIBRATION_SAMPLES):
+    """Convert to TFLite with float16 weights or int8 post-training quantization"""
+    saved_model_dir = tempfile.mkdtemp(prefix='trash_savedmodel_')
+    try:
+        converter = _tflite_converter(model, saved_model_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'fp16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            if not val_dir:
+                raise ValueError("int8 quantization needs a validation directory for calibration")
+            converter.representative_dataset = representative_dataset(val_dir, num_samples)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        else:
+            raise ValueError(f"Unknown quantization '{quantization}'")
+        tflite_model = converter.convert()
+    finally:
+        shutil.rmtree(saved_model_dir, ignore_errors=True)
+
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    print(f"Saved {quantization} TFLite model to {output_path} ({len(tflite_model) / 1e6:.1f} MB)")
+    return output_path
+
+def export_onnx(model, output_path, opset=13):
+    """Convert to ONNX with a dynamic batch dimension (needs tf2onnx)"""
+    import tf2onnx
+
+    input_shape = model.inputs[0].shape
+    spec = (tf.TensorSpec((None,) + tuple(input_shape[1:]), tf.float32, name='input'),)
+
+    @tf.function(input_signature=spec)
+    def serving(x):
+        return model(x, training=False)
+
+    tf2onnx.convert.from_function(serving, input_signature=spec, opset=opset, output_path=output_path)
+    print(f"Saved ONNX model to {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    return output_path
+
+def export_all(model_path=MODEL_PATH, val_dir=os.path.join('rubbish-data', 'val'),
+               formats=EXPORT_FORMATS, num_samples=CALIBRATION_SAMPLES, model=None, output_dir=None):
+    """Write every requested export into model/ (or output_dir); failures are reported, not fatal"""
+    if model is None:
+        from tensorflow.keras.models import load_model
+        model = load_model(model_path)
+
+    exported = {}
+    for export_format in formats:
+        output_path = ENGINE_PATHS[export_format]
+        if output_dir:
+            output_path = os.path.join(output_dir, os.path.basename(output_path))
+        try:
+            if export_format == 'tflite-fp16':
+                exported[export_format] = export_tflite(model, output_path, 'fp16')
+            elif export_format == 'tflite-int8':
+                exported[export_format] = export_tflite(model, output_path, 'int8', val_dir, num_samples)
+            elif export_format == 'onnx':
+                exported[export_format] = export_onnx(model, output_path)
+        except ImportError as e:
+            print(f"Skipping {export_format} export, missing dependency: {e}")
+        except Exception as e:
+            print(f"Error exporting {export_format}: {e}")
+    return exported
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trash classifier to TFLite and ONNX")
+    parser.add_argument('--model', default=MODEL_PATH, help="Keras .h5 model to convert")
+    parser.add_argument('--val-dir', default=os.path.join('rubbish-data', 'val'),
+                        help="Validation split used to calibrate int8 quantization")
+    parser.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+    parser.add_argument('--calibration-samples', type=int, default=CALIBRATION_SAMPLES)
+    parser.add_argument('--output-dir', default=None, help="Write the exports here instead of model/ "
+                                                           "(e.g. a model/versions/<version>/ directory)")
+    args = parser.parse_args()
+
+    export_all(args.model, args.val_dir, args.formats, args.calibration_samples, output_dir=args.output_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Versioned model directory and the pointer to the version being served.
+
+    python model_registry.py list
+    python model_registry.py publish                  # snapshot model/ as a new version
+    python model_registry.py promote 20261017-224754  # serve that version
+
+model/versions/<version>/ holds everything one model needs: the Keras .h5 and any
+TFLite/ONNX exports (same file names as in model/), class_names.txt,
+calibration.json and its metrics (prediction_stats.json from train_model.py,
+report.json from retrain.py). model/versions/CURRENT names the version the apps
+serve, so promoting is one atomic file write. Running apps pick the change up
+(MODEL_WATCH_INTERVAL_S) or are told through POST /admin/model, then load and warm
+up the version in the background and swap it in while requests continue.
+
+New versions are written to a hidden staging directory in model/versions/ and
+renamed into place once complete, so a version is either whole or absent.
+
+Without a CURRENT file the apps serve the files in model/ as before.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from classifier import CALIBRATION_PATH, CLASS_NAMES_PATH, MODEL_PATH, load_class_names, load_temperature
+from inference_engine import DEFAULT_ENGINE, ENGINE_PATHS, create_engine
+
+MODEL_DIR = os.path.dirname(MODEL_PATH)
+VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+# Metrics shown for a version, first file found wins
+METRICS_FILES = ('prediction_stats.json', 'report.json')
+
+
+def version_dir(version, versions_dir=VERSIONS_DIR):
+    if not version or os.sep in version or version.startswith('.'):
+        raise ValueError(f"Invalid model version {version!r}")
+    return os.path.join(versions_dir, version)
+
+
+def list_versions(versions_dir=VERSIONS_DIR):
+    """Names of the versions that have a Keras model, oldest first (staging directories are skipped)"""
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir)
+                  if not name.startswith('.') and os.path.exists(os.path.join(versions_dir, name, os.path.basename(MODEL_PATH))))
+
+
+def current_version(versions_dir=VERSIONS_DIR):
+    """Version named by CURRENT, or None when the apps should serve model/"""
+    try:
+        with open(os.path.join(versions_dir, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(version, versions_dir=VERSIONS_DIR):
+    """Point CURRENT at a version; readers see either the old or the new name, never half of one"""
+    if version not in list_versions(versions_dir):
+        raise KeyError(f"Unknown model version {version!r}")
+    temporary = os.path.join(versions_dir, f'CURRENT.{os.getpid()}.tmp')
+    with open(temporary, 'w') as f:
+        f.write(version + '\n')
+    os.replace(temporary, os.path.join(versions_dir, 'CURRENT'))
+
+
+def new_version_name(versions_dir=VERSIONS_DIR):
+    """Timestamped name that no version uses yet"""
+    version = time.strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(versions_dir, version)):
+        suffix += 1
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    return version
+
+
+def staging_dir(versions_dir=VERSIONS_DIR):
+    """New hidden directory in versions_dir to write a version into before commit_version()"""
+    os.makedirs(versions_dir, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix='.staging-', dir=versions_dir)
+    # mkdtemp creates it 0700; versions are as readable as the rest of model/
+    os.chmod(directory, 0o755)
+    return directory
+
+
+def commit_version(directory, version, versions_dir=VERSIONS_DIR):
+    """Rename a completely written staging directory to version; returns the version's directory"""
+    target = version_dir(version, versions_dir)
+    if os.path.exists(target):
+        raise FileExistsError(f"Model version {version} already exists")
+    os.rename(directory, target)
+    return target
+
+
+def publish(paths, versions_dir=VERSIONS_DIR):
+    """Copy model files (missing ones are skipped) into a new version; returns its name"""
+    directory = staging_dir(versions_dir)
+    try:
+        for path in paths:
+            if os.path.exists(path):
+                shutil.copy(path, directory)
+        version = new_version_name(versions_dir)
+        commit_version(directory, version, versions_dir)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return version
+
+
+def model_files(directory=MODEL_DIR, metrics='prediction_stats.json'):
+    """Files that make up one model: exports, class names, calibration and metrics"""
+    names = [os.path.basename(path) for path in ENGINE_PATHS.values()]
+    names += [os.path.basename(CLASS_NAMES_PATH), os.path.basename(CALIBRATION_PATH)]
+    return [os.path.join(directory, name) for name in names] + [metrics]
+
+
+def read_metrics(version, versions_dir=VERSIONS_DIR):
+    for name in METRICS_FILES:
+        path = os.path.join(version_dir(version, versions_dir), name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return {}
+
+
+def describe(version, versions_dir=VERSIONS_DIR):
+    """Version name, engines it has artifacts for and its metrics"""
+    directory = version_dir(version, versions_dir)
+    return {
+        'version': version,
+        'engines': [engine for engine, path in ENGINE_PATHS.items()
+                    if os.path.exists(os.path.join(directory, os.path.basename(path)))],
+        'metrics': read_metrics(version, versions_dir)
+    }
+
+
+def attach_model_info(engine, directory=MODEL_DIR, version=None):
+    """Give an engine what results need besides probabilities: class names, temperature, version"""
+    engine.class_names = load_class_names(os.path.join(directory, os.path.basename(CLASS_NAMES_PATH)))
+    engine.temperature = load_temperature(os.path.join(directory, os.path.basename(CALIBRATION_PATH)))
+    engine.model_version = version or engine.version
+    return engine
+
+
+def load_version(version, engine=None, versions_dir=VERSIONS_DIR, num_threads=None):
+    """Create the engine for one version's artifact; raises if it is missing or does not load"""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINE_PATHS:
+        raise ValueError(f"Unknown inference engine '{engine}' (choose from {', '.join(ENGINE_PATHS)})")
+    directory = version_dir(version, versions_dir)
+    path = os.path.join(directory, os.path.basename(ENGINE_PATHS[engine]))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Version {version} has no {engine} model ({path}); "
+                                f"export it with: python model_export.py --model "
+                                f"{os.path.join(directory, os.path.basename(MODEL_PATH))} --output-dir {directory}")
+    return attach_model_info(create_engine(engine, path, num_threads), directory, version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, publish and promote model versions")
+    parser.add_argument('command', choices=['list', 'publish', 'promote'])
+    parser.add_argument('version', nargs='?', help="Version to promote")
+    parser.add_argument('--versions-dir', default=VERSIONS_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        current = current_version(args.versions_dir)
+        for version in list_versions(args.versions_dir):
+            info = describe(version, args.versions_dir)
+            accuracy = info['metrics'].get('test_accuracy', info['metrics'].get('new_test_accuracy'))
+            print(f"{'*' if version == current else ' '} {version}  engines: {', '.join(info['engines'])}"
+                  + (f"  test accuracy: {accuracy:.4f}" if accuracy is not None else ''))
+        if current is None:
+            print("No CURRENT version: the apps serve model/")
+    elif args.command == 'publish':
+        print(f"Published {publish(model_files(), args.versions_dir)}")
+    else:
+        if not args.version:
+            parser.error("promote needs a version")
+        set_current(args.version, args.versions_dir)
+        print(f"CURRENT -> {args.version}; running apps switch to it within MODEL_WATCH_INTERVAL_S")
+
+if __name__ == '__main__':
+    main()
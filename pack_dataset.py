@@ -0,0 +1,221 @@
+"""Pack rubbish-data into pre-resized uint8 shards, once.
+
+    python pack_dataset.py --source rubbish-data --output rubbish-data-packed
+    python pack_dataset.py --output rubbish-data-packed --verify
+
+Each split becomes <output>/<split>/shard-00000.npy ... (uint8, N x 224 x 224 x 3,
+decoded and resized like /upload with the default UPLOAD_DECODE_SIZE: JPEG draft
+decode near the image size, then cv2 bilinear resize), labels.npy and index.csv
+(position, source path, label, source sha1).
+manifest.json lists the classes, image size and every file with its sha256, so a
+reader can check it is looking at the data it expects. Readers memory-map the
+shards, so loading a batch is one sequential read instead of opening, decoding
+and resizing a JPEG per image.
+
+Used by train_model.py (INPUT_PIPELINE=packed) and compare_engines.py --packed.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from classifier import IMAGE_EXTENSIONS, IMG_SIZE, decode_image
+
+# 2: JPEG draft decode like /upload (version 1 packs decoded at full size)
+MANIFEST_VERSION = 2
+DEFAULT_PACKED_DIR = 'rubbish-data-packed'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def list_split(split_dir, class_names):
+    """(relative path, label) for split_dir/<class>/* in class, then file name order"""
+    samples = []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(split_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_name, filename), label))
+    return samples
+
+def decode_resized(fp, image_size=IMG_SIZE):
+    """Decode an image file or stream to (image_size, image_size, 3) uint8 RGB"""
+    import cv2
+    # Same reduced decode and resize as uploads, so the pixels match what the served model sees
+    image = cv2.resize(decode_image(fp, draft_size=image_size), (image_size, image_size))
+    if image.ndim == 2:
+        image = np.repeat(image[..., np.newaxis], 3, axis=2)
+    return image[..., :3]
+
+def load_resized(path, image_size):
+    """Decode one file to (image_size, image_size, 3) uint8 RGB plus the sha1 of its bytes"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return decode_resized(io.BytesIO(data), image_size), hashlib.sha1(data).hexdigest()
+
+def pack_split(source_dir, output_dir, split, class_names, image_size=IMG_SIZE, shard_size=1024, workers=None):
+    """Pack one split; returns its manifest entry. Unreadable images are skipped and listed"""
+    split_dir = os.path.join(source_dir, split)
+    out_dir = os.path.join(output_dir, split)
+    os.makedirs(out_dir, exist_ok=True)
+    samples = list_split(split_dir, class_names)
+
+    def load(sample):
+        try:
+            return load_resized(os.path.join(split_dir, sample[0]), image_size)
+        except Exception as e:
+            print(f"Skipping {sample[0]}: {e}")
+            return None
+
+    shards, index, labels, skipped = [], [], [], []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for start in range(0, len(samples), shard_size):
+            chunk = samples[start:start + shard_size]
+            loaded = list(executor.map(load, chunk))
+            kept = [(sample, item) for sample, item in zip(chunk, loaded) if item is not None]
+            skipped += [sample[0] for sample, item in zip(chunk, loaded) if item is None]
+            if not kept:
+                continue
+
+            name = f'shard-{len(shards):05d}.npy'
+            temporary = os.path.join(out_dir, name + '.tmp.npy')
+            images = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.uint8,
+                                               shape=(len(kept), image_size, image_size, 3))
+            for row, ((relative_path, label), (image, source_sha1)) in enumerate(kept):
+                images[row] = image
+                index.append((len(labels), relative_path, label, source_sha1))
+                labels.append(label)
+            images.flush()
+            del images
+            os.replace(temporary, os.path.join(out_dir, name))
+            shards.append({'file': name, 'samples': len(kept), 'sha256': file_sha256(os.path.join(out_dir, name))})
+            print(f"{split}: {len(labels)}/{len(samples)} images packed")
+
+    np.save(os.path.join(out_dir, 'labels.npy'), np.array(labels, dtype=np.int32))
+    with open(os.path.join(out_dir, 'index.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['position', 'path', 'label', 'source_sha1'])
+        writer.writerows(index)
+
+    return {
+        'samples': len(labels),
+        'skipped': skipped,
+        'shards': shards,
+        'labels': {'file': 'labels.npy', 'sha256': file_sha256(os.path.join(out_dir, 'labels.npy'))},
+        'index': {'file': 'index.csv', 'sha256': file_sha256(os.path.join(out_dir, 'index.csv'))}
+    }
+
+def load_manifest(packed_dir):
+    with open(os.path.join(packed_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported packed dataset version {manifest.get('version')} in {packed_dir}, "
+                         f"pack it again with pack_dataset.py")
+    return manifest
+
+def verify(packed_dir):
+    """Recompute every hash in the manifest; returns the list of files that do not match"""
+    manifest = load_manifest(packed_dir)
+    mismatched = []
+    for split, entry in manifest['splits'].items():
+        for item in entry['shards'] + [entry['labels'], entry['index']]:
+            path = os.path.join(packed_dir, split, item['file'])
+            if not os.path.exists(path) or file_sha256(path) != item['sha256']:
+                mismatched.append(path)
+    return mismatched
+
+
+class PackedSplit:
+    """Memory-mapped view of one packed split: uint8 images by position, plus labels"""
+
+    def __init__(self, packed_dir, split):
+        self.manifest = load_manifest(packed_dir)
+        if split not in self.manifest['splits']:
+            raise KeyError(f"Split {split!r} not in {packed_dir} (has {sorted(self.manifest['splits'])})")
+        entry = self.manifest['splits'][split]
+        self.directory = os.path.join(packed_dir, split)
+        self.class_names = self.manifest['classes']
+        self.image_size = self.manifest['image_size']
+        self.shards = [np.load(os.path.join(self.directory, shard['file']), mmap_mode='r')
+                       for shard in entry['shards']]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+        self.labels = np.load(os.path.join(self.directory, entry['labels']['file']))
+        self.samples = int(self.offsets[-1])
+
+    def __len__(self):
+        return self.samples
+
+    def paths(self):
+        """Source path of every position, relative to the split directory"""
+        with open(os.path.join(self.directory, 'index.csv'), newline='') as f:
+            return [row['path'] for row in csv.DictReader(f)]
+
+    def images(self, positions):
+        """Gather images by position into one (N, H, W, 3) uint8 array, reading each shard in order"""
+        positions = np.asarray(positions, dtype=np.int64)
+        out = np.empty((len(positions), self.image_size, self.image_size, 3), dtype=np.uint8)
+        shard_ids = np.searchsorted(self.offsets, positions, side='right') - 1
+        for shard_id in np.unique(shard_ids):
+            rows = np.nonzero(shard_ids == shard_id)[0]
+            local = positions[rows] - self.offsets[shard_id]
+            order = np.argsort(local)
+            out[rows[order]] = self.shards[shard_id][local[order]]
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack dataset splits into pre-resized uint8 shards")
+    parser.add_argument('--source', default='rubbish-data', help="Directory with <split>/<class>/ images")
+    parser.add_argument('--output', default=DEFAULT_PACKED_DIR)
+    parser.add_argument('--splits', nargs='+', default=['train', 'val', 'test'])
+    parser.add_argument('--image-size', type=int, default=IMG_SIZE)
+    parser.add_argument('--shard-size', type=int, default=1024, help="Images per shard file")
+    parser.add_argument('--workers', type=int, default=None, help="Decode threads (default: CPU count)")
+    parser.add_argument('--verify', action='store_true', help="Only check an existing pack against its manifest")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify(args.output)
+        for path in mismatched:
+            print(f"Hash mismatch: {path}")
+        print("OK" if not mismatched else f"{len(mismatched)} files do not match the manifest")
+        raise SystemExit(1 if mismatched else 0)
+
+    train_dir = os.path.join(args.source, 'train')
+    class_names = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': os.path.abspath(args.source),
+        'image_size': args.image_size,
+        'decode': 'draft',
+        'classes': class_names,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'splits': {}
+    }
+    # A pack without a manifest is incomplete; drop the old one until this run finishes
+    os.makedirs(args.output, exist_ok=True)
+    if os.path.exists(os.path.join(args.output, 'manifest.json')):
+        os.remove(os.path.join(args.output, 'manifest.json'))
+    start = time.perf_counter()
+    for split in args.splits:
+        manifest['splits'][split] = pack_split(args.source, args.output, split, class_names, args.image_size,
+                                               args.shard_size, args.workers)
+    with open(os.path.join(args.output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    print(f"Packed {sum(s['samples'] for s in manifest['splits'].values())} images in "
+          f"{time.perf_counter() - start:.1f}s into {args.output}")
+
+if __name__ == '__main__':
+    main()
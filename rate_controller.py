@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ClassificationRateController:
+    """Decide when the camera loop should submit a frame, based on measured inference latency
+
+    A prediction shown to the user is at most (submit interval + inference latency) old,
+    so the controller submits every max(target_freshness - latency, latency / cpu_budget)
+    seconds: as fresh as the target asks for, without keeping the model busy for more
+    than cpu_budget of the time.
+    """
+
+    def __init__(self, target_freshness_ms=300.0, cpu_budget=0.5, min_interval_ms=20.0,
+                 smoothing=0.2, window=100):
+        self.target_freshness = target_freshness_ms / 1000.0
+        self.cpu_budget = max(0.01, min(1.0, cpu_budget))
+        self.min_interval = min_interval_ms / 1000.0
+        self.smoothing = smoothing
+
+        self._lock = threading.Lock()
+        self._latency = None
+        self._frame_interval = None
+        self._last_frame = None
+        self._last_submit = None
+        self._last_prediction = None
+        self._latencies = deque(maxlen=window)
+        self._submits = deque(maxlen=window)
+        self.frames = 0
+        self.submitted = 0
+
+    def _ewma(self, current, sample):
+        return sample if current is None else current + self.smoothing * (sample - current)
+
+    def record_frame(self, now=None):
+        """Call once per captured frame to track the camera frame rate"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_frame is not None:
+                self._frame_interval = self._ewma(self._frame_interval, now - self._last_frame)
+            self._last_frame = now
+            self.frames += 1
+
+    def current_interval(self):
+        """Seconds to wait between submissions given the latency measured so far"""
+        with self._lock:
+            return self._interval()
+
+    def _interval(self):
+        if self._latency is None:
+            return self.min_interval
+        freshness_interval = self.target_freshness - self._latency
+        # Intervals run submit to submit, so latency / interval is the share of time spent classifying
+        budget_interval = self._latency / self.cpu_budget
+        return max(self.min_interval, freshness_interval, budget_interval)
+
+    def should_submit(self, now=None):
+        """True if enough time has passed since the last submitted frame"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._last_submit is None or now - self._last_submit >= self._interval()
+
+    def record_submit(self, now=None):
+        """Call when a frame is handed to the classifier"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_submit = now
+            self._submits.append(now)
+            self.submitted += 1
+
+    def record_inference(self, latency_seconds, now=None):
+        """Call from the classifier with the time spent preprocessing + predicting one frame"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._latency = self._ewma(self._latency, latency_seconds)
+            self._latencies.append(latency_seconds)
+            self._last_prediction = now
+
+    def reset(self):
+        """Forget timing state when the camera stops; keep the latency estimate"""
+        with self._lock:
+            self._last_frame = None
+            self._last_submit = None
+            self._frame_interval = None
+            self._submits.clear()
+
+    def get_stats(self):
+        """Return the effective rate, measured latencies and frame rate"""
+        now = time.monotonic()
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000 if self._latencies else None
+            if len(self._submits) > 1:
+                span = self._submits[-1] - self._submits[0]
+                rate = (len(self._submits) - 1) / span if span > 0 else 0.0
+            else:
+                rate = 0.0
+            return {
+                'target_freshness_ms': round(self.target_freshness * 1000, 1),
+                'cpu_budget': self.cpu_budget,
+                'submit_interval_ms': round(self._interval() * 1000, 1),
+                'effective_rate_per_sec': round(rate, 2),
+                'camera_fps': round(1.0 / self._frame_interval, 2) if self._frame_interval else 0.0,
+                'inference_latency_ms': round(self._latency * 1000, 1) if self._latency is not None else None,
+                'inference_latency_p50_ms': round(float(np.percentile(latencies, 50)), 1) if latencies is not None else None,
+                'inference_latency_p95_ms': round(float(np.percentile(latencies, 95)), 1) if latencies is not None else None,
+                'prediction_age_ms': round((now - self._last_prediction) * 1000, 1) if self._last_prediction else None,
+                'frames': self.frames,
+                'submitted_frames': self.submitted
+            }
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def image_cache_key(image, model_version):
+    """Hash decoded pixels (plus shape/dtype and model version) into a cache key"""
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{model_version}|{image.shape}|{image.dtype}|".encode())
+    digest.update(memoryview(image).cast('B'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU in-memory cache of classification results with an optional on-disk tier"""
+
+    # Scanning the disk tier is O(entries), so only do it every N writes
+    DISK_EVICT_INTERVAL = 64
+
+    def __init__(self, max_entries=1024, disk_dir=None, disk_max_bytes=64 * 1024 * 1024,
+                 ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_writes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                       'memory_evictions': 0, 'disk_evictions': 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return a copy of the cached result, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                result, stored_at = entry
+                if self._fresh(stored_at):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return dict(result)
+                del self._memory[key]
+
+        result = self._disk_get(key)
+        with self._lock:
+            if result is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._memory_put(key, result)
+        return dict(result)
+
+    def put(self, key, result):
+        """Store a result in memory and, if enabled, on disk"""
+        result = dict(result)
+        with self._lock:
+            self._memory_put(key, result)
+        self._disk_put(key, result)
+
+    def clear(self):
+        """Drop every entry, e.g. after the model changes"""
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir:
+            with self._disk_lock:
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith('.json'):
+                        os.remove(os.path.join(self.disk_dir, name))
+
+    def get_stats(self):
+        """Return hit/miss/eviction counters and current sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['disk_enabled'] = bool(self.disk_dir)
+        return stats
+
+    def _fresh(self, stored_at):
+        return not self.ttl_seconds or time.time() - stored_at < self.ttl_seconds
+
+    def _memory_put(self, key, result):
+        self._memory[key] = (result, time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['memory_evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.json')
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if not self._fresh(os.path.getmtime(path)):
+                os.remove(path)
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def _disk_put(self, key, result):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(result, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {path}: {e}")
+            return
+        with self._lock:
+            self._disk_writes += 1
+            evict = self._disk_writes % self.DISK_EVICT_INTERVAL == 0
+        if evict:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        """Remove expired entries, then the oldest ones until the directory fits its size budget"""
+        with self._disk_lock:
+            entries = []
+            now = time.time()
+            for name in os.listdir(self.disk_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if self.ttl_seconds and now - stat.st_mtime >= self.ttl_seconds:
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.disk_max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._stats['disk_evictions'] += 1
@@ -0,0 +1,233 @@
+"""Incremental retraining from newly labeled captures.
+
+    python retrain.py --new-data labeled-captures --epochs 3
+    python retrain.py --labels corrections.csv --uploads app/static/uploads --replay-per-class 100
+
+Starts from the served model (the CURRENT version in model/versions/, else
+model/trash_classification_model.h5) instead of ImageNet weights and fine-tunes
+the head plus the last --fine-tune-layers backbone layers (the same layers
+train_model.py phase 2 unfreezes) on:
+  - new samples: --new-data/<class>/* and/or the rows of --labels, a CSV of
+    (filename, class_name) for files under --uploads (e.g. corrected captures)
+  - a replay subset of the original training data (--replay-per-class images per
+    class from rubbish-data/train, or from a pack_dataset.py output with --packed)
+    so the model does not forget what it already knew
+
+The new model is written as a new version in model/versions/<version>/ (see
+model_registry.py) together with its class names, calibration and a report (time
+to new model, test accuracy of the previous and the new model). Everything is
+written to a staging directory first and renamed into place after the report, so
+a failed run leaves no partial version behind. The served model
+is left untouched unless --promote is given, which points model/versions/CURRENT
+at the new version; running apps then swap it in without a restart.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from classifier import CALIBRATION_PATH, CLASS_NAMES_PATH, IMG_SIZE, MODEL_PATH, load_class_names
+from model_registry import (commit_version, current_version, new_version_name, set_current, staging_dir,
+                            version_dir as registry_dir)
+from pack_dataset import PackedSplit, list_split, load_resized
+
+# Same augmentation settings as train_model.py
+AUGMENTATION = dict(
+    rotation_range=20,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    fill_mode='nearest'
+)
+
+def load_images(paths):
+    """Decode and resize files like the serving path; unreadable ones are reported and dropped"""
+    images, kept = [], []
+    for path in paths:
+        try:
+            images.append(load_resized(path, IMG_SIZE)[0])
+            kept.append(path)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+    return np.array(images, dtype=np.uint8).reshape(-1, IMG_SIZE, IMG_SIZE, 3), kept
+
+def new_samples(class_names, new_data=None, labels_csv=None, uploads='app/static/uploads'):
+    """(path, label) of the newly labeled or corrected samples"""
+    samples = []
+    if new_data:
+        samples += [(os.path.join(new_data, path), label) for path, label in list_split(new_data, class_names)]
+    if labels_csv:
+        with open(labels_csv, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['class_name'] not in class_names:
+                    raise ValueError(f"Unknown class {row['class_name']!r} for {row['filename']}")
+                samples.append((os.path.join(uploads, os.path.basename(row['filename'])),
+                                class_names.index(row['class_name'])))
+    return samples
+
+def replay_samples(class_names, per_class, data_dir='rubbish-data', packed_dir=None, seed=0):
+    """Images and labels of a random subset of the original training data, per_class per class"""
+    rng = np.random.default_rng(seed)
+    if packed_dir:
+        packed = PackedSplit(packed_dir, 'train')
+        remap = np.array([class_names.index(name) for name in packed.class_names])
+        labels = remap[packed.labels]
+        positions = np.concatenate([rng.permutation(np.nonzero(labels == label)[0])[:per_class]
+                                    for label in range(len(class_names))]).astype(np.int64)
+        return packed.images(np.sort(positions)), labels[np.sort(positions)]
+
+    train_dir = os.path.join(data_dir, 'train')
+    samples = list_split(train_dir, class_names)
+    chosen = []
+    for label in range(len(class_names)):
+        paths = [os.path.join(train_dir, path) for path, sample_label in samples if sample_label == label]
+        chosen += [(path, label) for path in rng.permutation(paths)[:per_class]]
+    return load_labeled(chosen)
+
+def load_labeled(samples):
+    """uint8 images and labels for (path, label) samples"""
+    images, kept = load_images([path for path, _ in samples])
+    label_of = dict(samples)
+    return images, np.array([label_of[path] for path in kept], dtype=np.int32)
+
+def load_split(class_names, split, data_dir='rubbish-data', packed_dir=None):
+    """All images and labels of one split of the original dataset"""
+    if packed_dir:
+        packed = PackedSplit(packed_dir, split)
+        remap = np.array([class_names.index(name) for name in packed.class_names])
+        return packed.images(np.arange(len(packed))), remap[packed.labels]
+    split_dir = os.path.join(data_dir, split)
+    return load_labeled([(os.path.join(split_dir, path), label) for path, label in list_split(split_dir, class_names)])
+
+def accuracy(model, images, labels, batch_size=64):
+    probabilities = model.predict(np.divide(images, 127.5, dtype=np.float32) - 1, batch_size=batch_size, verbose=0)
+    return float(np.mean(np.argmax(probabilities, axis=1) == labels))
+
+def unfreeze_for_fine_tuning(model, fine_tune_layers):
+    """Train the head and the last fine_tune_layers backbone layers, freeze the rest"""
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    head_start = next(index for index, layer in enumerate(model.layers)
+                      if isinstance(layer, GlobalAveragePooling2D))
+    for index, layer in enumerate(model.layers):
+        layer.trainable = index >= head_start - fine_tune_layers
+
+def retrain(new, class_names, model_path=MODEL_PATH, replay_per_class=100, epochs=3, batch_size=32,
+            learning_rate=1e-4, fine_tune_layers=20, data_dir='rubbish-data', packed_dir=None, seed=0):
+    """Fine-tune the current model on new + replay samples; returns (model, report)"""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.optimizers import Adam
+    from data_pipeline import finish_batches
+
+    start = time.perf_counter()
+    tf.keras.utils.set_random_seed(seed)
+    model = load_model(model_path, compile=False)
+
+    new_images, new_labels = load_labeled(new)
+    replay_images, replay_labels = replay_samples(class_names, replay_per_class, data_dir, packed_dir, seed)
+    images = np.concatenate([new_images, replay_images])
+    labels = np.concatenate([new_labels, replay_labels])
+    data_s = time.perf_counter() - start
+    print(f"{len(new_images)} new and {len(replay_images)} replay samples ready after {data_s:.1f}s")
+
+    unfreeze_for_fine_tuning(model, fine_tune_layers)
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='categorical_crossentropy',
+                  metrics=['accuracy'])
+    dataset = tf.data.Dataset.from_tensor_slices((images, labels)).shuffle(len(images), seed=seed)
+    dataset = finish_batches(dataset.batch(batch_size), len(class_names), AUGMENTATION)
+    history = model.fit(dataset, epochs=epochs, verbose=2)
+
+    report = {
+        'base_model': model_path,
+        'new_samples': len(new_images),
+        'replay_samples': len(replay_images),
+        'epochs': epochs,
+        'fine_tune_layers': fine_tune_layers,
+        'data_s': round(data_s, 2),
+        'train_s': round(time.perf_counter() - start - data_s, 2),
+        'final_train_accuracy': float(history.history['accuracy'][-1])
+    }
+    return model, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the current model on newly labeled samples")
+    parser.add_argument('--new-data', default=None, help="Directory of <class>/ folders with new samples")
+    parser.add_argument('--labels', default=None, help="CSV with filename,class_name for files in --uploads")
+    parser.add_argument('--uploads', default=os.path.join('app', 'static', 'uploads'))
+    parser.add_argument('--model', default=None, help="Model to start from (default: the served one)")
+    parser.add_argument('--data-dir', default='rubbish-data', help="Original dataset (replay and test split)")
+    parser.add_argument('--packed', default=None, help="Read replay/test data from a pack_dataset.py output")
+    parser.add_argument('--replay-per-class', type=int, default=100)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--fine-tune-layers', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--promote', action='store_true', help="Serve the new version (set model/versions/CURRENT)")
+    args = parser.parse_args()
+
+    served = current_version()
+    model_dir = registry_dir(served) if served else os.path.dirname(MODEL_PATH)
+    args.model = args.model or os.path.join(model_dir, os.path.basename(MODEL_PATH))
+    class_names_path = os.path.join(model_dir, os.path.basename(CLASS_NAMES_PATH))
+    class_names = load_class_names(class_names_path)
+    new = new_samples(class_names, args.new_data, args.labels, args.uploads)
+    if not new:
+        raise SystemExit("No new samples: pass --new-data and/or --labels")
+
+    start = time.perf_counter()
+    model, report = retrain(new, class_names, args.model, args.replay_per_class, args.epochs, args.batch_size,
+                            args.learning_rate, args.fine_tune_layers, args.data_dir, args.packed, args.seed)
+
+    staging = staging_dir()
+    try:
+        model.save(os.path.join(staging, os.path.basename(MODEL_PATH)))
+        shutil.copy(class_names_path, staging)
+        report['time_to_new_model_s'] = round(time.perf_counter() - start, 2)
+
+        # Recalibrate on the validation split, as train_model.py does
+        from classifier import fit_temperature
+        val_images, val_labels = load_split(class_names, 'val', args.data_dir, args.packed)
+        if len(val_labels):
+            val_probabilities = model.predict(np.divide(val_images, 127.5, dtype=np.float32) - 1, verbose=0)
+            report['calibration_temperature'] = fit_temperature(val_probabilities, val_labels)
+            with open(os.path.join(staging, os.path.basename(CALIBRATION_PATH)), 'w') as f:
+                json.dump({"temperature": report['calibration_temperature']}, f, indent=4)
+
+        # Previous vs. new model on the test split
+        from tensorflow.keras.models import load_model
+        test_images, test_labels = load_split(class_names, 'test', args.data_dir, args.packed)
+        report['test_samples'] = len(test_labels)
+        report['previous_test_accuracy'] = accuracy(load_model(args.model, compile=False), test_images, test_labels)
+        report['new_test_accuracy'] = accuracy(model, test_images, test_labels)
+
+        version = new_version_name()
+        version_dir = registry_dir(version)
+        new_model_path = os.path.join(version_dir, os.path.basename(MODEL_PATH))
+        report['version'] = version
+        report['path'] = new_model_path
+        with open(os.path.join(staging, 'report.json'), 'w') as f:
+            json.dump(report, f, indent=4)
+        # Only a complete version appears under model/versions/
+        commit_version(staging, version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"New model {new_model_path} after {report['time_to_new_model_s']:.1f}s "
+          f"({report['new_samples']} new + {report['replay_samples']} replay samples, {args.epochs} epochs)")
+    print(f"Test accuracy: previous {report['previous_test_accuracy']:.4f} -> new {report['new_test_accuracy']:.4f}")
+
+    if args.promote:
+        set_current(version)
+        print(f"Serving version {version}")
+    print(f"TFLite/ONNX engines need: python model_export.py --model {new_model_path} --output-dir {version_dir}")
+
+if __name__ == '__main__':
+    main()
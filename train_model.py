@@ -3,11 +3,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
 import json
+import logging
+import time
 
 # Configuration
 IMG_SIZE = 224  # MobileNetV2 input size requirement
@@ -17,20 +19,40 @@ BASE_DIR = 'rubbish-data'
 MODEL_DIR = 'model'
 MODEL_PATH = os.path.join(MODEL_DIR, 'trash_classification_model.h5')
 
+# Phase 1 trains only the head, so with FEATURE_CACHE=1 the frozen backbone's features are
+# computed once (FEATURE_AUGMENT_COPIES augmented passes over the training set, 0 = one
+# unaugmented pass), memory-mapped from FEATURE_CACHE_DIR and reused across epochs and runs
+FEATURE_CACHE = os.environ.get('FEATURE_CACHE', '0') == '1'
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', 'feature_cache')
+FEATURE_AUGMENT_COPIES = int(os.environ.get('FEATURE_AUGMENT_COPIES', 5))
+
+# Input pipeline: 'keras' (ImageDataGenerator), 'tfdata' (data_pipeline.py: parallel decoding,
+# decoded images cached after the first epoch, augmentation on whole batches, prefetching) or
+# 'packed' (the same, reading pre-resized shards from PACKED_DATA_DIR written by pack_dataset.py).
+# With TFDATA_CACHE_DIR the decoded images are cached on disk instead of in memory
+INPUT_PIPELINE = os.environ.get('INPUT_PIPELINE', 'keras')
+TFDATA_CACHE_DIR = os.environ.get('TFDATA_CACHE_DIR', '')
+PACKED_DATA_DIR = os.environ.get('PACKED_DATA_DIR', 'rubbish-data-packed')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
 # Ensure model directory exists
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Get class names from directory structure
+# Get class names from directory structure (or the packed dataset's manifest)
 train_dir = os.path.join(BASE_DIR, 'train')
-classes = sorted([d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d))])
+if INPUT_PIPELINE == 'packed':
+    from pack_dataset import load_manifest
+    classes = load_manifest(PACKED_DATA_DIR)['classes']
+else:
+    classes = sorted([d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d))])
 num_classes = len(classes)
 
 print(f"Trash classification classes: {classes}")
 print(f"Total number of classes: {num_classes}")
 
-# Data generators with augmentation for training set
-train_datagen = ImageDataGenerator(
-    preprocessing_function=lambda x: x / 127.5 - 1,  # Normalize to [-1, 1]
+# Augmentation for the training set (also part of the feature cache key)
+AUGMENTATION = dict(
     rotation_range=20,
     width_shift_range=0.2,
     height_shift_range=0.2,
@@ -40,34 +62,48 @@ train_datagen = ImageDataGenerator(
     fill_mode='nearest'
 )
 
+# Data generators with augmentation for training set
+train_datagen = ImageDataGenerator(
+    preprocessing_function=lambda x: x / 127.5 - 1,  # Normalize to [-1, 1]
+    **AUGMENTATION
+)
+
 # Only normalization for validation and test sets
 val_datagen = ImageDataGenerator(preprocessing_function=lambda x: x / 127.5 - 1)
 test_datagen = ImageDataGenerator(preprocessing_function=lambda x: x / 127.5 - 1)
 
-# Create data generators
-train_generator = train_datagen.flow_from_directory(
-    os.path.join(BASE_DIR, 'train'),
-    target_size=(IMG_SIZE, IMG_SIZE),
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=True
-)
-
-validation_generator = val_datagen.flow_from_directory(
-    os.path.join(BASE_DIR, 'val'),
-    target_size=(IMG_SIZE, IMG_SIZE),
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=False
-)
+def make_input(split, datagen, shuffle, augmentation=None):
+    """Batches of rubbish-data/<split> from the selected input pipeline"""
+    directory = os.path.join(BASE_DIR, split)
+    if INPUT_PIPELINE == 'packed':
+        from data_pipeline import PackedDataset
+        return PackedDataset(PACKED_DATA_DIR, split, BATCH_SIZE, shuffle=shuffle, augmentation=augmentation)
+    if INPUT_PIPELINE == 'tfdata':
+        from data_pipeline import DirectoryDataset
+        cache = os.path.join(TFDATA_CACHE_DIR, split) if TFDATA_CACHE_DIR else ''
+        return DirectoryDataset(directory, classes, IMG_SIZE, BATCH_SIZE, shuffle=shuffle,
+                                augmentation=augmentation, cache=cache)
+    return datagen.flow_from_directory(
+        directory,
+        target_size=(IMG_SIZE, IMG_SIZE),
+        batch_size=BATCH_SIZE,
+        class_mode='categorical',
+        shuffle=shuffle
+    )
+
+def fit_input(generator):
+    """(data, steps) for fit/evaluate: Keras iterators never end, so they need a step count"""
+    if INPUT_PIPELINE in ('tfdata', 'packed'):
+        return generator.dataset, None
+    return generator, generator.samples // BATCH_SIZE
 
-test_generator = test_datagen.flow_from_directory(
-    os.path.join(BASE_DIR, 'test'),
-    target_size=(IMG_SIZE, IMG_SIZE),
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=False
-)
+# Create data generators
+train_generator = make_input('train', train_datagen, shuffle=True, augmentation=AUGMENTATION)
+validation_generator = make_input('val', val_datagen, shuffle=False)
+test_generator = make_input('test', test_datagen, shuffle=False)
+train_input, train_steps = fit_input(train_generator)
+validation_input, validation_steps = fit_input(validation_generator)
+test_input, test_steps = fit_input(test_generator)
 
 # Save class mapping for later use
 class_indices = train_generator.class_indices
@@ -92,11 +128,20 @@ for layer in base_model.layers:
     layer.trainable = False
 
 # Add custom classification head
-x = base_model.output
-x = GlobalAveragePooling2D()(x)
-x = Dense(512, activation='relu')(x)
-x = Dropout(0.5)(x)  # Prevent overfitting
-predictions = Dense(num_classes, activation='softmax')(x)
+# The head layers are shared with the feature-cache head model, so training either trains both
+head_layers = [
+    Dense(512, activation='relu'),
+    Dropout(0.5),  # Prevent overfitting
+    Dense(num_classes, activation='softmax')
+]
+
+def apply_head(x):
+    for layer in head_layers:
+        x = layer(x)
+    return x
+
+pooled = GlobalAveragePooling2D()(base_model.output)
+predictions = apply_head(pooled)
 
 # Create final model
 model = Model(inputs=base_model.input, outputs=predictions)
@@ -138,14 +183,57 @@ callbacks = [checkpoint, early_stopping, reduce_lr]
 
 # Phase 1: Train only the top layers
 print("Starting training phase 1 (top layers only)...")
-history = model.fit(
-    train_generator,
-    steps_per_epoch=train_generator.samples // BATCH_SIZE,
-    validation_data=validation_generator,
-    validation_steps=validation_generator.samples // BATCH_SIZE,
-    epochs=10,
-    callbacks=callbacks
-)
+phase1_start = time.perf_counter()
+if FEATURE_CACHE:
+    from feature_cache import cached_features
+    feature_config = {
+        'backbone': 'MobileNetV2',
+        'weights': 'imagenet',
+        'image_size': IMG_SIZE,
+        'augmentation': AUGMENTATION,
+        'input_pipeline': INPUT_PIPELINE,
+        'decode': 'draft' if INPUT_PIPELINE in ('tfdata', 'packed') else 'keras'
+    }
+    feature_extractor = Model(inputs=base_model.input, outputs=pooled)
+    if FEATURE_AUGMENT_COPIES:
+        train_features, train_labels = cached_features(feature_extractor, train_generator, 'train', feature_config,
+                                                       copies=FEATURE_AUGMENT_COPIES, cache_dir=FEATURE_CACHE_DIR)
+    else:
+        plain_train_generator = make_input('train', val_datagen, shuffle=False)
+        train_features, train_labels = cached_features(feature_extractor, plain_train_generator, 'train-plain',
+                                                       feature_config, cache_dir=FEATURE_CACHE_DIR)
+    val_features, val_labels = cached_features(feature_extractor, validation_generator, 'val', feature_config,
+                                               cache_dir=FEATURE_CACHE_DIR)
+    print(f"Features ready after {time.perf_counter() - phase1_start:.1f}s "
+          f"({len(train_features)} training, {len(val_features)} validation)")
+
+    # Same head layers on pooled features; no checkpoint here since this model isn't the full one
+    feature_input = Input(shape=(train_features.shape[1],))
+    head_model = Model(inputs=feature_input, outputs=apply_head(feature_input))
+    head_model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    history = head_model.fit(
+        train_features,
+        train_labels,
+        batch_size=BATCH_SIZE,
+        validation_data=(val_features, val_labels),
+        epochs=10,
+        shuffle=True,
+        callbacks=[early_stopping, reduce_lr]
+    )
+else:
+    history = model.fit(
+        train_input,
+        steps_per_epoch=train_steps,
+        validation_data=validation_input,
+        validation_steps=validation_steps,
+        epochs=10,
+        callbacks=callbacks
+    )
+print(f"Phase 1 took {time.perf_counter() - phase1_start:.1f}s")
 
 # Phase 2: Fine-tuning - unfreeze some layers of the base model
 print("Fine-tuning the last layers of base model...")
@@ -162,20 +250,34 @@ model.compile(
 # Continue training with fine-tuning
 print("Starting training phase 2 (fine-tuning)...")
 history_fine = model.fit(
-    train_generator,
-    steps_per_epoch=train_generator.samples // BATCH_SIZE,
-    validation_data=validation_generator,
-    validation_steps=validation_generator.samples // BATCH_SIZE,
+    train_input,
+    steps_per_epoch=train_steps,
+    validation_data=validation_input,
+    validation_steps=validation_steps,
     epochs=EPOCHS,
     callbacks=callbacks
 )
 
 # Evaluate model on test set
 print("Evaluating model on test set...")
-test_loss, test_acc = model.evaluate(test_generator, steps=test_generator.samples // BATCH_SIZE)
+test_loss, test_acc = model.evaluate(test_input, steps=test_steps)
 print(f"Test accuracy: {test_acc:.4f}")
 print(f"Test loss: {test_loss:.4f}")
 
+# Calibrate confidences: fit a softmax temperature on the validation set for the saved (best) model
+print("Fitting confidence calibration on the validation set...")
+from tensorflow.keras.models import load_model
+from classifier import calibration_nll, fit_temperature
+best_model = load_model(MODEL_PATH)
+validation_generator.reset()
+val_probabilities = best_model.predict(validation_input)
+val_labels = validation_generator.classes
+temperature = fit_temperature(val_probabilities, val_labels)
+print(f"Temperature: {temperature:.3f} (validation NLL {calibration_nll(val_probabilities, val_labels, 1.0):.4f} "
+      f"-> {calibration_nll(val_probabilities, val_labels, temperature):.4f})")
+with open(os.path.join(MODEL_DIR, 'calibration.json'), 'w') as f:
+    json.dump({"temperature": temperature}, f, indent=4)
+
 # Save test evaluation metrics
 evaluation_stats = {
     "test_accuracy": float(test_acc),
@@ -184,12 +286,25 @@ evaluation_stats = {
     "num_classes": num_classes,
     "image_size": IMG_SIZE,
     "final_epoch_val_accuracy": float(history_fine.history['val_accuracy'][-1]),
-    "final_epoch_val_loss": float(history_fine.history['val_loss'][-1])
+    "final_epoch_val_loss": float(history_fine.history['val_loss'][-1]),
+    "calibration_temperature": temperature
 }
 
 with open('prediction_stats.json', 'w') as f:
     json.dump(evaluation_stats, f, indent=4)
 
+# Export TFLite (float16 / int8 calibrated on the validation set) and ONNX versions of the best model
+# Compare them against the Keras model with: python compare_engines.py
+print("Exporting TFLite and ONNX models...")
+from model_export import export_all
+export_all(MODEL_PATH, os.path.join(BASE_DIR, 'val'))
+
+# Keep this run as a version in the model registry (model/versions/); running apps switch to it
+# without a restart once it is promoted
+from model_registry import model_files, publish
+model_version = publish(model_files())
+print(f"Published model version {model_version}; serve it with: python model_registry.py promote {model_version}")
+
 # Plot training results
 plt.figure(figsize=(12, 4))
 